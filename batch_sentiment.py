@@ -0,0 +1,373 @@
+"""
+Batch VADER scoring.
+
+`BatchSentimentScorer.polarity_scores_many(texts)` gives the same dicts as
+calling `SentimentIntensityAnalyzer.polarity_scores` on each text, but
+scores the whole batch at once: texts are tokenized with VADER's own
+rules, every token's lexicon/booster/negation features come from one
+precompiled word table, and the per-token rules (boosters with distance
+decay, ALL-CAPS emphasis, negation, "no", "least", "kind of") plus the
+per-text sums, punctuation emphasis and compound normalization run as
+NumPy array operations over all tokens of all texts.
+
+Parity: `compound` matches VADER to within COMPOUND_TOLERANCE (1e-4, one
+unit in the last rounded digit; differences come only from the order of
+float operations). Texts whose score depends on VADER's multi-word idiom
+table ("the bomb", "kind of", "to die for", ...) are scored by VADER
+itself, and its "but" rule is applied with VADER's own code, so both are
+exact.
+
+    python batch_sentiment.py --parity [texts.txt|conversations.jsonl]
+
+checks parity on a generated corpus (plus the given file) and exits
+non-zero if any compound score is outside the tolerance.
+"""
+import sys
+
+import numpy as np
+from vaderSentiment.vaderSentiment import (
+    BOOSTER_DICT, C_INCR, N_SCALAR, NEGATE, SPECIAL_CASES,
+    SentimentIntensityAnalyzer, SentiText,
+)
+
+COMPOUND_TOLERANCE = 1e-4
+
+# words the shifted-array rules look for
+_NEVER, _SO_THIS, _WITHOUT, _DOUBT, _NO, _OR_NOR, _LEAST, _AT_VERY, _KIND, _OF = (
+    1 << b for b in range(10)
+)
+_FLAG_WORDS = {
+    "never": _NEVER, "so": _SO_THIS, "this": _SO_THIS, "without": _WITHOUT,
+    "doubt": _DOUBT, "no": _NO, "or": _OR_NOR, "nor": _OR_NOR, "least": _LEAST,
+    "at": _AT_VERY, "very": _AT_VERY, "kind": _KIND, "of": _OF,
+}
+_NEGATE = frozenset(NEGATE)
+
+# Any adjacent word pair from a multi-word special case or booster n-gram:
+# texts containing one go through VADER's idiom logic instead.
+_IDIOM_BIGRAMS = frozenset(
+    " ".join(pair)
+    for phrase in list(SPECIAL_CASES) + [b for b in BOOSTER_DICT if " " in b]
+    for pair in zip(phrase.split(), phrase.split()[1:])
+)
+_IDIOM_FIRST = frozenset(b.split()[0] for b in _IDIOM_BIGRAMS)
+
+
+class BatchSentimentScorer:
+    def __init__(self, analyzer=None):
+        if analyzer is None:
+            from mindmate_engine import get_analyzer
+            analyzer = get_analyzer()
+        self.analyzer = analyzer
+        self.lexicon = analyzer.lexicon
+        self._emoji_chars = {k: v for k, v in analyzer.emojis.items() if len(k) == 1}
+        self._features = {}  # raw token -> feature tuple, see _token
+
+    # ----- tokenization (VADER's rules, fast paths where they can't matter) -----
+
+    def _replace_emojis(self, text):
+        emojis = self._emoji_chars
+        if emojis.keys().isdisjoint(text):
+            return text
+        out = []
+        prev_space = True
+        for ch in text:
+            description = emojis.get(ch)
+            if description is not None:
+                if not prev_space:
+                    out.append(" ")
+                out.append(description)
+                prev_space = False
+            else:
+                out.append(ch)
+                prev_space = ch == " "
+        return "".join(out)
+
+    def _token(self, raw):
+        """
+        Features of one whitespace-separated token, cached:
+        (stripped, lower, valence, in_lexicon, booster, negation, flags, isupper).
+        """
+        feats = self._features.get(raw)
+        if feats is None:
+            word = SentiText._strip_punc_if_word(raw)
+            lower = word.lower()
+            valence = self.lexicon.get(lower)
+            feats = (
+                word,
+                lower,
+                valence or 0.0,
+                valence is not None,
+                BOOSTER_DICT.get(lower, 0.0),
+                lower in _NEGATE or "n't" in lower,
+                _FLAG_WORDS.get(lower, 0),
+                word.isupper(),
+            )
+            if len(self._features) < 500_000:
+                self._features[raw] = feats
+        return feats
+
+    # ----- scoring -----
+
+    def polarity_scores_many(self, texts):
+        """List of VADER-style score dicts, one per text."""
+        texts = list(texts)
+        n_texts = len(texts)
+        results = [None] * n_texts
+
+        rows = []  # token feature tuples for every text on the vectorized path
+        vec_texts, counts, but_texts = [], [], []
+        capdiff_t = np.zeros(n_texts, dtype=bool)
+        amp_t = np.zeros(n_texts)
+        token = self._token
+
+        for t, raw in enumerate(texts):
+            text = raw if raw.isascii() else self._replace_emojis(raw)
+            text = text.strip()
+            toks = [token(w) for w in text.split()]
+            if not toks:
+                results[t] = {"neg": 0.0, "neu": 0.0, "pos": 0.0, "compound": 0.0}
+                continue
+            lowers = [f[1] for f in toks]
+            if not _IDIOM_FIRST.isdisjoint(lowers[:-1]) and any(
+                a + " " + b in _IDIOM_BIGRAMS for a, b in zip(lowers, lowers[1:])
+            ):
+                results[t] = self.analyzer.polarity_scores(raw)
+                continue
+            if "but" in lowers:
+                but_texts.append((t, len(rows), [f[0] for f in toks]))
+            n_upper = sum(f[7] for f in toks)
+            capdiff_t[t] = 0 < len(toks) - n_upper < len(toks)
+            amp_t[t] = _punctuation_amplifier(text)
+            rows.extend(toks)
+            vec_texts.append(t)
+            counts.append(len(toks))
+
+        if rows:
+            _, _, lexv, inlex, boost, negw, flags, upper = zip(*rows)
+            counts = np.array(counts)
+            seg = np.repeat(np.array(vec_texts), counts)
+            starts = np.cumsum(counts) - counts
+            pos = np.arange(len(rows)) - np.repeat(starts, counts)
+            tlen = np.repeat(counts, counts)
+            sentiments = self._token_sentiments(
+                np.array(lexv), np.array(inlex), np.array(boost), np.array(negw),
+                np.array(flags, dtype=np.int64), np.array(upper),
+                seg, pos, tlen, capdiff_t,
+            )
+            # VADER's 'but' rule, applied with its own code to stay exact
+            for t, lo, words in but_texts:
+                hi = lo + len(words)
+                sentiments[lo:hi] = SentimentIntensityAnalyzer._but_check(
+                    words, sentiments[lo:hi].tolist()
+                )
+            self._score_texts(sentiments, seg, amp_t, n_texts, results)
+        return results
+
+    def compound_many(self, texts):
+        """Just the compound scores, as a list of floats."""
+        return [s["compound"] for s in self.polarity_scores_many(texts)]
+
+    @staticmethod
+    def _token_sentiments(lexv, inlex, boost, negw, flags, upper, seg, pos, tlen, capdiff_t):
+        n = len(lexv)
+        capdiff = capdiff_t[seg]
+
+        def prev(a, k, fill=False):
+            """a[i - k] within the same text, `fill` where i - k is before its start."""
+            out = np.full(n, fill, dtype=a.dtype)
+            if k < n:
+                out[k:] = a[:n - k]
+            out[pos < k] = fill
+            return out
+
+        def has(f, flag):
+            return (f & flag) != 0
+
+        nxt_inlex = np.zeros(n, dtype=bool)
+        nxt_inlex[:-1] = inlex[1:]
+        nxt_inlex &= pos < tlen - 1
+        nxt_of = np.zeros(n, dtype=bool)
+        nxt_of[:-1] = has(flags[1:], _OF)
+        nxt_of &= pos < tlen - 1
+
+        # tokens whose valence counts: lexicon words that aren't boosters or "kind" in "kind of"
+        active = inlex & (boost == 0) & ~(has(flags, _KIND) & nxt_of)
+
+        v = lexv.copy()
+        # "no" before another lexicon word only negates it
+        v[has(flags, _NO) & nxt_inlex] = 0.0
+        f1, f2, f3 = prev(flags, 1, 0), prev(flags, 2, 0), prev(flags, 3, 0)
+        after_no = has(f1, _NO) | has(f2, _NO) | (has(f3, _NO) & has(f1, _OR_NOR))
+        v = np.where(after_no, lexv * N_SCALAR, v)
+
+        # ALL-CAPS emphasis (only when some but not all words are caps)
+        caps = upper & capdiff
+        v = np.where(caps, np.where(v > 0, v + C_INCR, v - C_INCR), v)
+
+        for k, decay in ((0, 1.0), (1, 0.95), (2, 0.9)):
+            cond = (pos > k) & ~prev(inlex, k + 1)
+            pb = prev(boost, k + 1, 0.0)
+            s = np.where(v < 0, -pb, pb)
+            boost_caps = (pb != 0) & prev(upper, k + 1) & capdiff
+            s = np.where(boost_caps, np.where(v > 0, s + C_INCR, s - C_INCR), s)
+            if decay != 1.0:
+                s = s * decay
+            v = np.where(cond, v + s, v)
+
+            neg_k = prev(negw, k + 1)
+            if k == 0:
+                v = np.where(cond & neg_k, v * N_SCALAR, v)
+            elif k == 1:
+                never_so = has(f2, _NEVER) & has(f1, _SO_THIS)
+                without_doubt = has(f2, _WITHOUT) & has(f1, _DOUBT)
+                v = np.where(cond & never_so, v * 1.25,
+                             np.where(cond & ~without_doubt & neg_k, v * N_SCALAR, v))
+            else:
+                # same precedence as VADER: (never and so/this) or (so/this just before)
+                never_so = (has(f3, _NEVER) & has(f2, _SO_THIS)) | has(f1, _SO_THIS)
+                without_doubt = has(f3, _WITHOUT) & (has(f2, _DOUBT) | has(f1, _DOUBT))
+                v = np.where(cond & never_so, v * 1.25,
+                             np.where(cond & ~without_doubt & neg_k, v * N_SCALAR, v))
+
+        # "least" as negation (not "at least" / "very least")
+        least1 = ~prev(inlex, 1) & has(f1, _LEAST)
+        v = np.where((pos > 1) & least1 & ~has(f2, _AT_VERY), v * N_SCALAR, v)
+        v = np.where((pos == 1) & least1, v * N_SCALAR, v)
+
+        return np.where(active, v, 0.0)
+
+    @staticmethod
+    def _score_texts(sentiments, seg, amp_t, n_texts, results):
+        sum_s = np.bincount(seg, weights=sentiments, minlength=n_texts)
+        amp = amp_t
+        sum_s = np.where(sum_s > 0, sum_s + amp, np.where(sum_s < 0, sum_s - amp, sum_s))
+        compound = np.clip(sum_s / np.sqrt(sum_s * sum_s + 15), -1.0, 1.0)
+
+        pos_sum = np.bincount(seg, weights=np.where(sentiments > 0, sentiments + 1, 0.0),
+                              minlength=n_texts)
+        neg_sum = np.bincount(seg, weights=np.where(sentiments < 0, sentiments - 1, 0.0),
+                              minlength=n_texts)
+        neu_count = np.bincount(seg, weights=(sentiments == 0), minlength=n_texts)
+        abs_neg = np.abs(neg_sum)
+        pos_wins, neg_wins = pos_sum > abs_neg, pos_sum < abs_neg
+        pos_sum = np.where(pos_wins, pos_sum + amp, pos_sum)
+        neg_sum = np.where(neg_wins, neg_sum - amp, neg_sum)
+        total = pos_sum + np.abs(neg_sum) + neu_count
+        with np.errstate(invalid="ignore", divide="ignore"):
+            pos = np.abs(pos_sum / total)
+            neg = np.abs(neg_sum / total)
+            neu = np.abs(neu_count / total)
+
+        for t in np.unique(seg).tolist():
+            results[t] = {
+                "neg": round(float(neg[t]), 3),
+                "neu": round(float(neu[t]), 3),
+                "pos": round(float(pos[t]), 3),
+                "compound": round(float(compound[t]), 4),
+            }
+
+
+def _punctuation_amplifier(text):
+    ep = min(text.count("!"), 4) * 0.292
+    qm_count = text.count("?")
+    qm = 0
+    if qm_count > 1:
+        qm = qm_count * 0.18 if qm_count <= 3 else 0.96
+    return ep + qm
+
+
+# ========= PARITY CHECK =========
+
+_PARITY_WORDS = (
+    "i am not very happy today but the weekend was great GREAT so sad never this "
+    "bad without doubt no good least at kind of sort of the bomb to die for "
+    "really REALLY hardly barely isn't don't can't love hate awful fine okay "
+    "lonely scared anxious nervous tired exhausted worthless amazing wonderful "
+    "kinda sorta most more less little extremely :) :( <3 !!! ?? ??? 😊 💔 🙂 "
+    "nor or least very hope hopeless cry crying smile happy sad no never "
+    "friends family work school exam dog cat sleep"
+).split()
+
+
+def parity_corpus(n=5000, seed=0):
+    """Random sentences mixing lexicon words, boosters, negations, caps and emoji."""
+    import random
+    rnd = random.Random(seed)
+    out = []
+    for _ in range(n):
+        words = [rnd.choice(_PARITY_WORDS) for _ in range(rnd.randint(0, 25))]
+        text = " ".join(words)
+        if rnd.random() < 0.3:
+            text += rnd.choice(["!", "!!", "?", "??", ".", "..."])
+        out.append(text)
+    return out
+
+
+def check_parity(texts, scorer=None, tolerance=COMPOUND_TOLERANCE):
+    """(max |compound difference|, list of (text, vader, batch) outside tolerance)."""
+    scorer = scorer or BatchSentimentScorer()
+    batch = scorer.polarity_scores_many(texts)
+    worst = 0.0
+    failures = []
+    for text, got in zip(texts, batch):
+        want = scorer.analyzer.polarity_scores(text)
+        diff = abs(want["compound"] - got["compound"])
+        worst = max(worst, diff)
+        if diff > tolerance + 1e-12:
+            failures.append((text, want["compound"], got["compound"]))
+    return worst, failures
+
+
+def _read_texts(path):
+    import json
+    texts = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                texts.append(line)
+                continue
+            if isinstance(record, dict):
+                for m in record.get("messages", []):
+                    texts.append(m if isinstance(m, str) else m.get("text", ""))
+                for field in ("text", "body", "title"):
+                    if isinstance(record.get(field), str):
+                        texts.append(record[field])
+            elif isinstance(record, str):
+                texts.append(record)
+    return texts
+
+
+def main(argv=None):
+    import time
+    argv = sys.argv[1:] if argv is None else argv
+    if not argv or argv[0] != "--parity":
+        print("usage: batch_sentiment.py --parity [texts.txt|conversations.jsonl]", file=sys.stderr)
+        return 2
+    texts = parity_corpus()
+    for path in argv[1:]:
+        texts += _read_texts(path)
+    scorer = BatchSentimentScorer()
+    worst, failures = check_parity(texts, scorer)
+    for text, want, got in failures[:20]:
+        print(f"MISMATCH vader={want} batch={got}: {text[:80]!r}")
+
+    t0 = time.perf_counter()
+    for text in texts:
+        scorer.analyzer.polarity_scores(text)
+    t1 = time.perf_counter()
+    scorer.polarity_scores_many(texts)
+    t2 = time.perf_counter()
+    print(f"{len(texts)} texts, max |compound diff| {worst:.6f} "
+          f"(tolerance {COMPOUND_TOLERANCE}), {len(failures)} outside")
+    print(f"vader {len(texts) / (t1 - t0):,.0f} texts/s, batch {len(texts) / (t2 - t1):,.0f} texts/s")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
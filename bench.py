@@ -0,0 +1,440 @@
+"""
+Benchmarks for the reply engine and the chat page.
+
+    python bench.py                          # run and print
+    python bench.py --save                   # run and write bench_baseline.json
+    python bench.py --compare                # run, exit 1 on regressions
+    python bench.py --compare --threshold 0.5 --filter reply
+
+The corpus is generated from the active intent pack: every intent's
+phrases inside neutral filler, every contextual follow-up (with its
+question as the last assistant turn), sentences for each sentiment
+bucket and mood, short and very long messages, and histories of 1 to
+1000 turns. The run fails if a branch of the reply logic is never hit.
+
+Each benchmark reports the best per-call time over several repeats (the
+least noisy figure); cold imports report the median. Results are machine-specific: refresh the baseline
+with --save when the hardware changes, and on purpose when a slowdown is
+accepted.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import time
+
+from mood import ESCALATE_STREAK
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_BASELINE = os.path.join(HERE, "bench_baseline.json")
+DEFAULT_THRESHOLD = 0.3  # fail when more than 30% slower than the baseline
+# ...and slower by more than this (seconds): microsecond-scale timings
+# swing by about that much between interpreter runs
+DEFAULT_MIN_DELTA = 2e-6
+
+HISTORY_SIZES = (1, 10, 100, 1000)
+
+_FILLER = (
+    "today the train was late and then I walked home past the park "
+    "thinking about the week and what comes next"
+).split()
+
+_BUCKET_SENTENCES = {
+    "very_negative": [
+        "everything is awful and I feel terrible and hopeless",
+        "I hate how horrible and painful this week has been",
+    ],
+    "negative": [
+        "I am a bit sad today",
+        "work was bad",
+    ],
+    "mixed": [
+        "I went to the shop and came back",
+        "nothing much happened, just the usual",
+    ],
+    "positive": [
+        "it was a fine day",
+        "I feel a little better",
+    ],
+    "very_positive": [
+        "I had a wonderful amazing day and I love my friends",
+        "great news, I passed and I am so happy",
+    ],
+}
+_MOOD_SENTENCES = {
+    "anxious": "I feel so anxious and scared about everything, it is terrible",
+    "lonely": "I feel lonely and sad, nobody cares and it hurts",
+    "overwhelmed": "I am overwhelmed and exhausted, this is awful",
+}
+
+
+# ========= SYNTHETIC CORPUS =========
+
+def _filler(rnd, n):
+    return " ".join(rnd.choice(_FILLER) for _ in range(n))
+
+
+def synthetic_corpus(registry=None, seed=0):
+    """
+    (message, last assistant turn or None) pairs covering every branch of
+    the reply logic, in short and long forms.
+    """
+    from mindmate_engine import active_registry
+
+    registry = registry or active_registry()
+    rnd = random.Random(seed)
+    cases = []
+    for intent in registry.intents:
+        for phrase in intent.phrases[:5]:
+            cases.append((f"{_filler(rnd, 3)} {phrase} {_filler(rnd, 3)}", None))
+        for exact in sorted(intent.exact)[:3]:
+            cases.append((exact, None))
+
+    templates = registry.templates
+    for key, question in registry.followups.items():
+        asking = next(
+            (t for group in templates.values() for t in group.texts
+             if question in t.lower() and not group.formatted),
+            None,
+        )
+        if asking is None:
+            continue
+        for sentences in (_BUCKET_SENTENCES["very_positive"], _BUCKET_SENTENCES["negative"]):
+            cases.append((sentences[0], asking))
+
+    for sentences in _BUCKET_SENTENCES.values():
+        cases.extend((s, None) for s in sentences)
+    cases.extend((s, None) for s in _MOOD_SENTENCES.values())
+    return cases
+
+
+def long_message(seed=0, words=400):
+    rnd = random.Random(seed)
+    parts = [_filler(rnd, 20)]
+    sentences = [s for ss in _BUCKET_SENTENCES.values() for s in ss]
+    while sum(len(p.split()) for p in parts) < words:
+        parts.append(rnd.choice(sentences))
+        parts.append(_filler(rnd, 10))
+    return ". ".join(parts)
+
+
+def make_history(n_turns, last_assistant=None, as_list=False):
+    """
+    A history of `n_turns` alternating turns ending with an assistant turn.
+    Its assistant turns ask no follow-up question, so a reply to it takes
+    the same branch whatever its length.
+    """
+    from conversation import Conversation
+    from mindmate_engine import active_registry
+
+    registry = active_registry()
+    questions = registry.followups.values()
+    texts = [t for t in registry.templates["mixed"].texts
+             if not any(q in t.lower() for q in questions)]
+    turns = []
+    for i in range(n_turns):
+        if (n_turns - i) % 2:
+            turns.append(("assistant", texts[i % len(texts)]))
+        else:
+            turns.append(("user", f"message number {i}"))
+    if last_assistant is not None:
+        turns[-1] = ("assistant", last_assistant)
+    if as_list:
+        return turns
+    return Conversation(turns, window=max(n_turns, 1))
+
+
+def check_coverage(cases):
+    """Names of the reply branches the corpus never reaches (should be empty)."""
+    from mindmate_engine import active_registry, respond
+
+    seen = set()
+    for text, asking in cases + [(long_message(), None)]:
+        history = make_history(2, asking)
+        reply = respond(text, history)
+        seen.add(reply.intent)
+        if reply.sent_label:
+            seen.add(reply.sent_label)
+    # a long run of negative messages
+    history = make_history(2)
+    for _ in range(ESCALATE_STREAK):
+        seen.add(respond(_BUCKET_SENTENCES["very_negative"][0], history).intent)
+    registry = active_registry()
+    expected = set(registry.templates) - {"opening", "fallback"}
+    if any(intent.name == "self_criticism" for intent in registry.priority):
+        # the self_criticism intent answers before the "wish" follow-up can
+        expected.discard("wish_self_critical")
+    expected |= set(_BUCKET_SENTENCES)
+    return sorted(expected - seen)
+
+
+# ========= TIMING =========
+
+def _best_per_call(fn, repeat=5, min_time=0.2):
+    """Best seconds per call of `fn` over `repeat` rounds of at least `min_time` each."""
+    number = 1
+    while True:
+        t0 = time.perf_counter()
+        for _ in range(number):
+            fn()
+        elapsed = time.perf_counter() - t0
+        if elapsed >= min_time / 4 or number >= 1 << 20:
+            break
+        number *= 2
+    best = elapsed / number
+    for _ in range(repeat - 1):
+        t0 = time.perf_counter()
+        for _ in range(number):
+            fn()
+        best = min(best, (time.perf_counter() - t0) / number)
+    return best
+
+
+def _cycle(items):
+    """Zero-argument callable returning the next item of `items` each call."""
+    state = [0]
+    n = len(items)
+
+    def step():
+        i = state[0]
+        state[0] = i + 1 if i + 1 < n else 0
+        return items[i]
+    return step
+
+
+def _engine_benchmarks(cases):
+    import mindmate_engine as engine
+
+    random.seed(0)
+    engine.warm_up()
+    texts = [text for text, _ in cases]
+    long_text = long_message()
+    nxt = _cycle(texts)
+    benches = {}
+
+    benches["check_risk/corpus"] = lambda: engine.check_risk(nxt())
+    benches["check_risk/long"] = lambda: engine.check_risk(long_text)
+
+    analyzer = engine.get_analyzer()
+    benches["vader/corpus"] = lambda: analyzer.polarity_scores(nxt())
+    benches["vader/long"] = lambda: analyzer.polarity_scores(long_text)
+
+    with_history = [(text, make_history(2, asking)) for text, asking in cases]
+    nxt_case = _cycle(with_history)
+
+    def reply_corpus():
+        text, history = nxt_case()
+        engine.supportive_reply(text, history)
+    benches["supportive_reply/corpus"] = reply_corpus
+
+    short_history = make_history(2)
+    benches["supportive_reply/long"] = lambda: engine.supportive_reply(long_text, short_history)
+
+    group = engine.active_registry().templates["heavy"]
+    for n in HISTORY_SIZES:
+        conv = make_history(n)
+        plain = make_history(n, as_list=True)
+        benches[f"supportive_reply/history-{n}"] = (
+            lambda conv=conv: engine.supportive_reply("work was bad", conv)
+        )
+        benches[f"supportive_reply/list-history-{n}"] = (
+            lambda plain=plain: engine.supportive_reply("work was bad", plain)
+        )
+        benches[f"pick_non_repeating/history-{n}"] = (
+            lambda conv=conv: engine._pick_non_repeating(group, conv)
+        )
+        benches[f"pick_non_repeating/list-history-{n}"] = (
+            lambda plain=plain: engine._pick_non_repeating(group, plain)
+        )
+    return benches
+
+
+def _cold_import(module, repeat=5):
+    """
+    Median seconds to import `module` in a fresh interpreter, minus
+    interpreter start (the median: process start-up is too noisy for the best).
+    """
+    def run(code):
+        times = []
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            subprocess.run([sys.executable, "-c", code], check=True, cwd=HERE)
+            times.append(time.perf_counter() - t0)
+        return statistics.median(times)
+    return max(0.0, run(f"import {module}") - run("pass"))
+
+
+def _streamlit_rerun(history_turns=30, repeat=5):
+    """Best seconds for a full script rerun of mindmate.py, idle and with a new message."""
+    from streamlit.testing.v1 import AppTest
+
+    os.environ.setdefault("MINDMATE_PACING", "off")  # time the script, not the typing delay
+    at = AppTest.from_file(os.path.join(HERE, "mindmate.py"), default_timeout=30)
+    at.run()
+    for i in range(history_turns // 2):
+        at.chat_input[0].set_value(f"message number {i}").run()
+    idle = message = float("inf")
+    for i in range(repeat):
+        t0 = time.perf_counter()
+        at.run()
+        idle = min(idle, time.perf_counter() - t0)
+        t0 = time.perf_counter()
+        at.chat_input[0].set_value("I had a long day but I'm okay").run()
+        message = min(message, time.perf_counter() - t0)
+    if at.exception:
+        raise RuntimeError(f"mindmate.py raised: {at.exception}")
+    return {"streamlit/rerun-idle": idle, "streamlit/rerun-message": message}
+
+
+def _streamlit_long_rerun(history_turns=400, repeat=5):
+    """Best seconds for an idle rerun of a long conversation with every earlier block loaded."""
+    from streamlit.testing.v1 import AppTest
+
+    os.environ.setdefault("MINDMATE_PACING", "off")
+    at = AppTest.from_file(os.path.join(HERE, "mindmate.py"), default_timeout=30)
+    at.run()
+    for i in range(history_turns // 2):
+        at.chat_input[0].set_value(f"message number {i}").run()
+    while True:
+        load = [b for b in at.button if b.key == "load_earlier"]
+        if not load:
+            break
+        load[0].click().run()
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        at.run()
+        best = min(best, time.perf_counter() - t0)
+    if at.exception:
+        raise RuntimeError(f"mindmate.py raised: {at.exception}")
+    return best
+
+
+def run_benchmarks(name_filter=None, quick=False, progress=None):
+    """{benchmark name: best seconds per call}."""
+    cases = synthetic_corpus()
+    missing = check_coverage(cases)
+    if missing:
+        raise RuntimeError(f"synthetic corpus never reaches: {', '.join(missing)}")
+
+    def wanted(name):
+        return not name_filter or name_filter in name
+
+    results = {}
+    repeat, min_time = (3, 0.05) if quick else (9, 0.1)
+    for name, fn in _engine_benchmarks(cases).items():
+        if wanted(name):
+            results[name] = _best_per_call(fn, repeat, min_time)
+            if progress:
+                progress(name, results[name])
+    for module in ("mindmate_engine", "mindmate_server"):
+        name = f"cold_import/{module}"
+        if wanted(name):
+            results[name] = _cold_import(module, repeat)
+            if progress:
+                progress(name, results[name])
+    if any(wanted(n) for n in ("streamlit/rerun-idle", "streamlit/rerun-message")):
+        for name, seconds in _streamlit_rerun(repeat=repeat).items():
+            if wanted(name):
+                results[name] = seconds
+                if progress:
+                    progress(name, seconds)
+    name = "streamlit/rerun-long"
+    if wanted(name):
+        results[name] = _streamlit_long_rerun(repeat=repeat)
+        if progress:
+            progress(name, results[name])
+    return results
+
+
+# ========= BASELINE =========
+
+def _environment():
+    return {
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "processor": platform.processor() or platform.machine(),
+        "cpus": os.cpu_count(),
+    }
+
+
+def save_baseline(results, path=DEFAULT_BASELINE):
+    data = {
+        "environment": _environment(),
+        "unit": "seconds per call",
+        "results": {name: round(seconds, 9) for name, seconds in sorted(results.items())},
+    }
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2)
+        f.write("\n")
+
+
+def compare(results, baseline, threshold=DEFAULT_THRESHOLD, min_delta=DEFAULT_MIN_DELTA):
+    """
+    (name, baseline, current, ratio) for every result slower than
+    baseline * (1 + threshold) and by more than `min_delta` seconds.
+    """
+    regressions = []
+    for name, seconds in sorted(results.items()):
+        before = baseline["results"].get(name)
+        if before and seconds > before * (1 + threshold) and seconds - before > min_delta:
+            regressions.append((name, before, seconds, seconds / before))
+    return regressions
+
+
+def _format_time(seconds):
+    if seconds >= 1:
+        return f"{seconds:8.2f} s "
+    if seconds >= 1e-3:
+        return f"{seconds * 1e3:8.2f} ms"
+    return f"{seconds * 1e6:8.2f} us"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="MindMate benchmarks")
+    parser.add_argument("--save", nargs="?", const=DEFAULT_BASELINE, metavar="PATH",
+                        help="write results as the new baseline (default bench_baseline.json)")
+    parser.add_argument("--compare", nargs="?", const=DEFAULT_BASELINE, metavar="PATH",
+                        help="compare with a baseline and exit 1 on regressions")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="allowed slowdown as a fraction (default 0.3 = 30%%)")
+    parser.add_argument("--min-delta", type=float, default=DEFAULT_MIN_DELTA,
+                        help="ignore slowdowns smaller than this many seconds (default 2e-6)")
+    parser.add_argument("--filter", help="only benchmarks whose name contains this")
+    parser.add_argument("--quick", action="store_true", help="fewer, shorter repeats")
+    args = parser.parse_args(argv)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+
+    def progress(name, seconds):
+        line = f"{name:42} {_format_time(seconds)}"
+        before = baseline and baseline["results"].get(name)
+        if before:
+            line += f"   {seconds / before:5.2f}x baseline"
+        print(line, flush=True)
+
+    results = run_benchmarks(args.filter, args.quick, progress)
+
+    if args.save:
+        save_baseline(results, args.save)
+        print(f"baseline written to {args.save}")
+    if baseline is None:
+        return 0
+    if baseline.get("environment") != _environment():
+        print("note: baseline was recorded on a different environment", file=sys.stderr)
+    regressions = compare(results, baseline, args.threshold, args.min_delta)
+    for name, before, now, ratio in regressions:
+        print(f"REGRESSION {name}: {_format_time(before).strip()} -> "
+              f"{_format_time(now).strip()} ({ratio:.2f}x)", file=sys.stderr)
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
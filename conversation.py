@@ -0,0 +1,141 @@
+"""
+Bounded chat history for one session.
+
+Turns live in a fixed number of ring-buffer slots. Assistant replies that
+are fixed templates are stored as their template ID (an int) instead of
+the text; anything else (user text, replies that quote the user) is
+stored as-is. The last assistant turn and the last few replies are kept
+up to date on every append, so nothing ever walks the history.
+
+Turns that fall out of the retention window go to `archive` (a plain list
+of compact (role, payload) pairs by default, or any object with
+`append`; pass None to just drop them).
+
+`mood` is the conversation's rolling MoodState; the reply engine folds
+each user message into it. `selector` picks its template replies without
+repeating recent ones (pass `seed` for reproducible picks).
+"""
+from collections import deque
+
+from intent_registry import template_id, template_text
+from mood import MoodState
+from template_selector import TemplateSelector
+
+ROLES = ("user", "assistant")
+_ROLE_CODES = {role: i for i, role in enumerate(ROLES)}
+_ASSISTANT = _ROLE_CODES["assistant"]
+
+_DEFAULT_ARCHIVE = object()
+
+
+def _encode(text):
+    tid = template_id(text)
+    return text if tid is None else tid
+
+
+def _decode(payload):
+    return template_text(payload) if type(payload) is int else payload
+
+
+class Conversation:
+    __slots__ = (
+        "window", "archive", "archived",
+        "_roles", "_payloads", "_head", "_count",
+        "_last_assistant", "_recent", "mood", "selector",
+    )
+
+    def __init__(self, turns=(), window=200, recent=8, archive=_DEFAULT_ARCHIVE, seed=None):
+        if window < 1:
+            raise ValueError("window must be at least 1")
+        self.window = window
+        self.archive = [] if archive is _DEFAULT_ARCHIVE else archive
+        self.archived = 0
+        self._roles = [0] * window
+        self._payloads = [None] * window
+        self._head = 0  # slot of the oldest retained turn
+        self._count = 0
+        self._last_assistant = None
+        self._recent = deque(maxlen=recent)
+        self.mood = MoodState()
+        self.selector = TemplateSelector(seed)
+        for role, text in turns:
+            self.append(role, text)
+
+    def append(self, role: str, text: str) -> None:
+        code = _ROLE_CODES[role]
+        payload = _encode(text)
+        if self._count == self.window:
+            slot = self._head
+            if self.archive is not None:
+                self.archive.append((self._roles[slot], self._payloads[slot]))
+            self.archived += 1
+            self._head = (self._head + 1) % self.window
+        else:
+            slot = (self._head + self._count) % self.window
+            self._count += 1
+        self._roles[slot] = code
+        self._payloads[slot] = payload
+        if code == _ASSISTANT:
+            self._last_assistant = payload
+            self._recent.append(payload)
+
+    # ----- O(1) context used by the reply engine -----
+
+    @property
+    def last_assistant(self):
+        """Text of the most recent assistant turn (None if there is none)."""
+        if self._last_assistant is None:
+            return None
+        return _decode(self._last_assistant)
+
+    @property
+    def last_assistant_id(self):
+        """Template ID of the most recent assistant turn, None if it wasn't a template."""
+        p = self._last_assistant
+        return p if type(p) is int else None
+
+    @property
+    def recent_replies(self):
+        """The last few assistant replies (template IDs or text), oldest first."""
+        return tuple(self._recent)
+
+    # ----- reading turns back -----
+
+    def __len__(self):
+        """Number of retained (non-archived) turns."""
+        return self._count
+
+    @property
+    def total(self) -> int:
+        """Every turn ever appended, archived ones included."""
+        return self.archived + self._count
+
+    def __iter__(self):
+        for i in range(self._count):
+            slot = (self._head + i) % self.window
+            yield ROLES[self._roles[slot]], _decode(self._payloads[slot])
+
+    def __reversed__(self):
+        for i in range(self._count - 1, -1, -1):
+            slot = (self._head + i) % self.window
+            yield ROLES[self._roles[slot]], _decode(self._payloads[slot])
+
+    def turns(self, start: int, stop: int):
+        """
+        (role, text) pairs for absolute turn indices [start, stop). Archived
+        turns are included when the archive is a list; otherwise only
+        retained turns are returned.
+        """
+        start = max(0, start)
+        stop = min(self.total, stop)
+        out = []
+        if start < self.archived and isinstance(self.archive, list):
+            for code, payload in self.archive[start:min(stop, self.archived)]:
+                out.append((ROLES[code], _decode(payload)))
+        for i in range(max(start, self.archived), stop):
+            slot = (self._head + i - self.archived) % self.window
+            out.append((ROLES[self._roles[slot]], _decode(self._payloads[slot])))
+        return out
+
+    def to_list(self):
+        return list(self)
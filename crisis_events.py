@@ -0,0 +1,322 @@
+"""
+Crisis events for on-call review, recorded off the reply path.
+
+    pipeline = CrisisPipeline("crisis/events.jsonl", sink=WebhookSink(url))
+    pipeline.submit(session_id, user_text, history.turns(...), registry)
+
+`submit` only puts the event on a bounded queue (dropping it, and counting
+the drop, when the queue is full), so a crisis reply never waits on disk
+or network. A worker thread takes events off in batches, finds the
+matched risk phrases and appends them as JSON lines to a local log that
+it rotates by size (the durable record; written directly, not through
+`logging`, so a host's logging configuration can't silence it). Logged batches go to a second thread that hands
+them to the sink, with a few retries. A slow or dead sink only delays
+later deliveries (and, once its bounded backlog is full, counts batches
+as failed); the local log and the replies are unaffected.
+
+Sinks are any object with `deliver(events)`: FileSink (JSON lines in
+another file, e.g. a shared spool), WebhookSink (one JSON POST per batch)
+and StubWebhookSink (keeps batches in memory, with optional delay or
+failure, for testing).
+"""
+import atexit
+import json
+import logging
+import os
+import queue
+import threading
+import time
+import urllib.request
+from typing import NamedTuple
+
+import metrics
+
+log = logging.getLogger(__name__)
+
+CONTEXT_TURNS = 6  # turns around the hit kept with the event
+
+
+class CrisisEvent(NamedTuple):
+    time: float  # unix time of the reply
+    session: str
+    text: str  # the user message that matched
+    phrases: tuple  # matched risk phrases (filled in by the worker)
+    turns: tuple  # (role, text) pairs around the message, crisis reply included
+    pack: str  # intent pack version
+
+    def to_dict(self):
+        d = self._asdict()
+        d["phrases"] = list(self.phrases)
+        d["turns"] = [list(t) for t in self.turns]
+        return d
+
+
+# ========= SINKS =========
+
+class FileSink:
+    """Appends each batch as JSON lines to `path`."""
+
+    def __init__(self, path):
+        self.path = path
+
+    def deliver(self, events):
+        lines = "".join(json.dumps(e.to_dict(), ensure_ascii=False) + "\n" for e in events)
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(lines)
+
+
+class WebhookSink:
+    """POSTs each batch as {"events": [...]} to `url`."""
+
+    def __init__(self, url, timeout=5.0, headers=None):
+        self.url = url
+        self.timeout = timeout
+        self.headers = {"Content-Type": "application/json", **(headers or {})}
+
+    def deliver(self, events):
+        body = json.dumps({"events": [e.to_dict() for e in events]}).encode("utf-8")
+        request = urllib.request.Request(self.url, data=body, headers=self.headers, method="POST")
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            response.read()
+
+
+class StubWebhookSink:
+    """Webhook stand-in for tests: keeps batches, optionally slow or failing."""
+
+    def __init__(self, delay=0.0, fail=False):
+        self.delay = delay
+        self.fail = fail
+        self.batches = []
+
+    def deliver(self, events):
+        if self.delay:
+            time.sleep(self.delay)
+        if self.fail:
+            raise ConnectionError("stub webhook is down")
+        self.batches.append(list(events))
+
+
+# ========= LOCAL LOG =========
+
+class _RotatingLog:
+    """
+    Appends lines to `path`; once it would grow past `max_bytes` it is
+    renamed to path.1 (path.1 to path.2, ... keeping `backups` of them)
+    and a new file started.
+    """
+
+    def __init__(self, path, max_bytes, backups):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self._file = open(path, "ab")
+
+    def write(self, text):
+        data = text.encode("utf-8") + b"\n"
+        if self.max_bytes and self._file.tell() and self._file.tell() + len(data) > self.max_bytes:
+            self._rotate()
+        self._file.write(data)
+        self._file.flush()
+
+    def _rotate(self):
+        self._file.close()
+        if self.backups:
+            for i in range(self.backups - 1, 0, -1):
+                older = f"{self.path}.{i}"
+                if os.path.exists(older):
+                    os.replace(older, f"{self.path}.{i + 1}")
+            os.replace(self.path, f"{self.path}.1")
+            self._file = open(self.path, "ab")
+        else:
+            self._file = open(self.path, "wb")
+
+    def close(self):
+        self._file.close()
+
+
+# ========= PIPELINE =========
+
+_STOP = object()
+
+
+class CrisisPipeline:
+    def __init__(self, log_path, sink=None, max_queue=10_000, batch_size=100,
+                 flush_interval=0.5, max_bytes=10 * 1024 * 1024, backups=10,
+                 retries=3, retry_delay=0.5):
+        self.log_path = log_path
+        self.sink = sink
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.retries = retries
+        self.retry_delay = retry_delay
+        self.queued = self.logged = self.delivered = self.dropped = self.failed = 0
+
+        directory = os.path.dirname(os.path.abspath(log_path))
+        os.makedirs(directory, exist_ok=True)
+        self._log = _RotatingLog(log_path, max_bytes, backups)
+        self._closed = False
+
+        self._queue = queue.Queue(maxsize=max_queue)
+        # logged batches waiting for the sink; its own thread, so a slow or
+        # dead sink never holds back the local log
+        self._outbox = queue.Queue(maxsize=max(1, max_queue // batch_size))
+        self._outcomes = {
+            name: metrics.CRISIS_EVENTS.labels(name)
+            for name in ("queued", "logged", "delivered", "dropped", "failed")
+        }
+        metrics.CRISIS_QUEUE.function = self._queue.qsize
+        self._lag = metrics.CRISIS_LAG.labels()
+        self._worker = threading.Thread(
+            target=self._run, name="mindmate-crisis-events", daemon=True
+        )
+        self._sender = threading.Thread(
+            target=self._run_sink, name="mindmate-crisis-sink", daemon=True
+        )
+        self._worker.start()
+        self._sender.start()
+
+    def submit(self, session_id, text, turns, registry) -> bool:
+        """
+        Queue a crisis event; never blocks. `turns` are the (role, text)
+        pairs around the message (the last CONTEXT_TURNS are kept) and
+        `registry` is the IntentRegistry that produced the reply.
+        Returns False if the queue was full and the event was dropped.
+        """
+        item = (time.time(), session_id, text, tuple(turns)[-CONTEXT_TURNS:], registry)
+        try:
+            self._queue.put_nowait(item)
+        except queue.Full:
+            self.dropped += 1
+            if metrics.ENABLED:
+                self._outcomes["dropped"].inc()
+            if self.dropped == 1 or self.dropped % 100 == 0:
+                log.warning("crisis event dropped: queue full (%d dropped so far)", self.dropped)
+            return False
+        self.queued += 1
+        if metrics.ENABLED:
+            self._outcomes["queued"].inc()
+        return True
+
+    def flush(self, timeout=10.0) -> bool:
+        """Wait until every queued event has been logged and delivered (tests, shutdown)."""
+        deadline = time.monotonic() + timeout
+        while self._queue.unfinished_tasks or self._outbox.unfinished_tasks:
+            if time.monotonic() >= deadline:
+                return False
+            time.sleep(0.01)
+        return True
+
+    def close(self, timeout=10.0):
+        """Log and deliver what is queued, then stop both threads."""
+        if self._closed:
+            return
+        self._closed = True
+        self.flush(timeout)
+        try:
+            self._queue.put(_STOP, timeout=timeout)
+        except queue.Full:
+            return
+        self._worker.join(timeout)
+        self._sender.join(timeout)
+
+    # ----- log thread -----
+
+    def _run(self):
+        while True:
+            items = [self._queue.get()]
+            deadline = time.monotonic() + self.flush_interval
+            while len(items) < self.batch_size and items[-1] is not _STOP:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    items.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            stop = items[-1] is _STOP
+            events = [self._event(item) for item in items if item is not _STOP]
+            try:
+                if events:
+                    self._write(events)
+            except Exception:
+                log.exception("crisis events: batch of %d not logged", len(events))
+            finally:
+                for _ in items:
+                    self._queue.task_done()
+            if stop:
+                self._log.close()
+                self._outbox.put(_STOP)
+                return
+
+    @staticmethod
+    def _event(item):
+        when, session_id, text, turns, registry = item
+        phrases = tuple(registry.matcher.phrases_in(text.strip().lower(), "risk"))
+        return CrisisEvent(when, session_id, text, phrases, turns, registry.version)
+
+    def _write(self, events):
+        self._log.write("\n".join(json.dumps(e.to_dict(), ensure_ascii=False) for e in events))
+        self.logged += len(events)
+        if metrics.ENABLED:
+            self._outcomes["logged"].inc(len(events))
+            now = time.time()
+            for e in events:
+                self._lag.observe(now - e.time)
+        if self.sink is None:
+            return
+        try:
+            self._outbox.put_nowait(events)
+        except queue.Full:
+            self._failed(events, "sink backlog full")
+
+    # ----- sink thread -----
+
+    def _run_sink(self):
+        while True:
+            events = self._outbox.get()
+            try:
+                if events is _STOP:
+                    return
+                self._deliver(events)
+            except Exception:
+                log.exception("crisis events: batch of %d not delivered", len(events))
+            finally:
+                self._outbox.task_done()
+
+    def _deliver(self, events):
+        for attempt in range(self.retries + 1):
+            try:
+                self.sink.deliver(events)
+            except Exception as exc:
+                if attempt < self.retries:
+                    time.sleep(self.retry_delay * 2 ** attempt)
+                    continue
+                self._failed(events, exc)
+                return
+            self.delivered += len(events)
+            if metrics.ENABLED:
+                self._outcomes["delivered"].inc(len(events))
+            return
+
+    def _failed(self, events, reason):
+        self.failed += len(events)
+        if metrics.ENABLED:
+            self._outcomes["failed"].inc(len(events))
+        log.error("crisis events: sink failed for %d events (kept in %s): %s",
+                  len(events), self.log_path, reason)
+
+
+def pipeline_from_env(environ=os.environ):
+    """
+    CrisisPipeline from MINDMATE_CRISIS_LOG (local log path) and optional
+    MINDMATE_CRISIS_WEBHOOK (URL); None if no log path is set. The
+    pipeline is closed at interpreter exit, so queued events still reach
+    the log.
+    """
+    path = environ.get("MINDMATE_CRISIS_LOG")
+    if not path:
+        return None
+    url = environ.get("MINDMATE_CRISIS_WEBHOOK")
+    pipeline = CrisisPipeline(path, sink=WebhookSink(url) if url else None)
+    atexit.register(pipeline.close)
+    return pipeline
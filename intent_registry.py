@@ -0,0 +1,438 @@
+"""
+Intent and template registry.
+
+`intents.json` declares, in one place, the intents the engine recognises
+(in priority order, crisis first), their trigger phrases, the mood words,
+the follow-up questions the engine reacts to, and every reply template.
+It is compiled once into an IntentRegistry: phrase lists into a single
+PhraseMatcher, templates into interned tuples with stable keys, so the
+reply path only reads prebuilt objects.
+
+A RegistryWatcher can poll the file and compile a changed pack in the
+background, handing the finished registry over in a single swap.
+
+    python intent_registry.py validate [intents.json]
+    python intent_registry.py diff old.json new.json
+"""
+import hashlib
+import json
+import logging
+import os
+import string
+import sys
+import threading
+
+from phrase_matcher import PhraseMatcher
+
+DEFAULT_REGISTRY_PATH = os.environ.get(
+    "MINDMATE_INTENTS",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "intents.json"),
+)
+
+log = logging.getLogger(__name__)
+
+# template groups / moods / follow-ups the engine's reply logic refers to
+REQUIRED_TEMPLATES = (
+    "opening", "risk", "helped_most", "circling_positive", "circling_negative",
+    "wish_self_critical", "wish", "anxious", "lonely", "overwhelmed",
+    "heavy", "mixed", "positive", "fallback",
+)
+REQUIRED_MOODS = ("anxious", "lonely", "overwhelmed")
+REQUIRED_FOLLOWUPS = ("helped_most", "circling", "wish")
+
+PLACEHOLDERS = {"text"}
+
+
+# ========= TEMPLATE IDS =========
+# Process-wide pool: every distinct fixed template text gets a small int
+# ID the first time any registry is built, and keeps it for the life of
+# the process. Conversation state stores these IDs, so they stay valid
+# even if the registry is rebuilt with different content.
+
+_pool_texts = []
+_pool_ids = {}
+_pool_lock = threading.Lock()
+
+
+def intern_template(text: str) -> int:
+    tid = _pool_ids.get(text)
+    if tid is None:
+        with _pool_lock:
+            tid = _pool_ids.get(text)
+            if tid is None:
+                tid = len(_pool_texts)
+                _pool_texts.append(text)
+                _pool_ids[text] = tid
+    return tid
+
+
+def template_id(text: str):
+    """ID of a fixed template text, or None if `text` isn't one."""
+    return _pool_ids.get(text)
+
+
+def template_text(tid: int) -> str:
+    return _pool_texts[tid]
+
+
+def template_key(group: str, text: str) -> str:
+    """Stable, content-derived key (same text in the same group -> same key)."""
+    return f"{group}:{hashlib.sha1(text.encode('utf-8')).hexdigest()[:10]}"
+
+
+class RegistryError(ValueError):
+    def __init__(self, problems):
+        super().__init__("invalid intent registry:\n  " + "\n  ".join(problems))
+        self.problems = problems
+
+
+class TemplateGroup:
+    """
+    The reply templates of one group. Templates containing `{text}` are
+    formatted with the (stripped) user message when picked.
+    """
+
+    __slots__ = ("name", "texts", "keys", "ids", "formatted", "_positions")
+
+    def __init__(self, name, texts):
+        self.name = name
+        self.texts = tuple(sys.intern(t) for t in texts)
+        self.keys = tuple(template_key(name, t) for t in self.texts)
+        self.formatted = "{text}" in self.texts[0]
+        if self.formatted:
+            self.ids = (None,) * len(self.texts)
+            self._positions = None
+        else:
+            self.ids = tuple(intern_template(t) for t in self.texts)
+            self._positions = {t: i for i, t in enumerate(self.texts)}
+
+    def __len__(self):
+        return len(self.texts)
+
+    def position(self, reply: str, text=None):
+        """Index of the template that renders to `reply`, or None."""
+        if self._positions is not None:
+            return self._positions.get(reply)
+        for i, t in enumerate(self.texts):
+            if t.format(text=text).strip() == reply:
+                return i
+        return None
+
+    def render(self, i: int, text=None) -> str:
+        t = self.texts[i]
+        return t.format(text=text) if self.formatted else t
+
+
+class Intent:
+    __slots__ = ("name", "phrases", "exact")
+
+    def __init__(self, name, phrases, exact):
+        self.name = name
+        self.phrases = tuple(phrases)
+        self.exact = frozenset(exact)
+
+
+class IntentRegistry:
+    def __init__(self, data, source=None, digest=None):
+        problems = validate(data)
+        if problems:
+            raise RegistryError(problems)
+        self.version = str(data["version"])
+        self.source = source
+        self.digest = digest  # sha1 of the file it was loaded from, if any
+        self.intents = tuple(
+            Intent(i["name"], i.get("phrases", ()), i.get("exact", ()))
+            for i in data["intents"]
+        )
+        # everything after the crisis intent, in the order it is checked
+        self.priority = self.intents[1:]
+        self.moods = {name: tuple(words) for name, words in data["moods"].items()}
+        self.followups = dict(data["followups"])
+        self.templates = {
+            name: TemplateGroup(name, texts) for name, texts in data["templates"].items()
+        }
+        groups = {intent.name: intent.phrases for intent in self.intents}
+        groups.update(self.moods)
+        self.matcher = PhraseMatcher(groups)
+
+    @property
+    def opening_message(self) -> str:
+        return self.templates["opening"].texts[0]
+
+    @property
+    def crisis_message(self) -> str:
+        return self.templates["risk"].texts[0]
+
+    def to_dict(self):
+        intents = []
+        for intent in self.intents:
+            entry = {"name": intent.name}
+            if intent.exact:
+                entry["exact"] = sorted(intent.exact)
+            entry["phrases"] = list(intent.phrases)
+            intents.append(entry)
+        return {
+            "version": self.version,
+            "intents": intents,
+            "moods": {name: list(words) for name, words in self.moods.items()},
+            "followups": dict(self.followups),
+            "templates": {name: list(g.texts) for name, g in self.templates.items()},
+        }
+
+
+def load_registry(path=DEFAULT_REGISTRY_PATH) -> IntentRegistry:
+    with open(path, "rb") as f:
+        raw = f.read()
+    data = json.loads(raw.decode("utf-8"))
+    return IntentRegistry(data, source=path, digest=hashlib.sha1(raw).hexdigest())
+
+
+# ========= HOT RELOAD =========
+
+class RegistryWatcher:
+    """
+    Polls a pack file and, when it changes, builds the new registry on the
+    watcher thread (matcher included) and passes it to `on_swap`. Replies
+    keep using the old registry until that single reference swap, so
+    nothing waits on the rebuild. An invalid pack is logged and ignored.
+    """
+
+    def __init__(self, path, on_swap, interval=1.0, current=None):
+        self.path = path
+        self.on_swap = on_swap
+        self.interval = interval
+        self.current = current
+        self.errors = 0
+        self._stamp = self._file_stamp()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _file_stamp(self):
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return None
+        return st.st_mtime_ns, st.st_size
+
+    def check_now(self) -> bool:
+        """Reload if the file changed since the last check; True if swapped."""
+        stamp = self._file_stamp()
+        if stamp is None or stamp == self._stamp:
+            return False
+        self._stamp = stamp
+        try:
+            new = load_registry(self.path)
+        except (OSError, ValueError) as exc:
+            # ValueError covers bad JSON and RegistryError
+            self.errors += 1
+            log.error("not reloading %s: %s", self.path, exc)
+            return False
+        old = self.current
+        if old is not None and new.digest == old.digest:
+            return False
+        if old is not None and new.version == old.version:
+            log.warning("%s changed but its version is still %r; bump it so replies "
+                        "can be told apart", self.path, new.version)
+        self.on_swap(new)
+        self.current = new
+        log.info("intent pack %r now active (was %r)",
+                 new.version, old.version if old is not None else None)
+        return True
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.check_now()
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(
+                target=self._run, name="mindmate-pack-watcher", daemon=True
+            )
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+
+# ========= VALIDATION =========
+
+def _check_phrases(where, phrases, problems):
+    if not isinstance(phrases, list):
+        problems.append(f"{where}: must be a list of strings")
+        return
+    seen = set()
+    for p in phrases:
+        if not isinstance(p, str) or not p:
+            problems.append(f"{where}: {p!r} is not a non-empty string")
+        elif p != p.lower():
+            problems.append(f"{where}: {p!r} is not lowercase and can never match")
+        elif p in seen:
+            problems.append(f"{where}: duplicate {p!r}")
+        seen.add(p)
+
+
+def _check_template(where, text, problems):
+    if not isinstance(text, str) or not text.strip():
+        problems.append(f"{where}: {text!r} is not a non-empty string")
+        return False
+    if text != text.strip():
+        problems.append(f"{where}: leading/trailing whitespace in {text[:40]!r}")
+    try:
+        fields = {f for _, f, _, _ in string.Formatter().parse(text) if f is not None}
+    except ValueError as exc:
+        problems.append(f"{where}: bad placeholder syntax ({exc}) in {text[:40]!r}")
+        return False
+    unknown = fields - PLACEHOLDERS
+    if unknown:
+        problems.append(f"{where}: unknown placeholder(s) {sorted(unknown)} in {text[:40]!r}")
+    return "text" in fields
+
+
+def validate(data) -> list:
+    """Every problem found in registry data (an empty list means it's valid)."""
+    problems = []
+    if not isinstance(data, dict):
+        return ["registry must be a JSON object"]
+    for key in ("version", "intents", "moods", "followups", "templates"):
+        if key not in data:
+            problems.append(f"missing {key!r}")
+    if problems:
+        return problems
+
+    templates = data["templates"]
+    if not isinstance(templates, dict):
+        return problems + ["templates: must be an object of name -> list"]
+
+    names = set()
+    intents = data["intents"]
+    if not isinstance(intents, list) or not intents:
+        problems.append("intents: must be a non-empty list")
+        intents = []
+    elif not isinstance(intents[0], dict) or intents[0].get("name") != "risk":
+        problems.append("intents: the first intent must be 'risk'")
+    for n, intent in enumerate(intents):
+        if not isinstance(intent, dict) or not isinstance(intent.get("name"), str):
+            problems.append(f"intents[{n}]: needs a string 'name'")
+            continue
+        name = intent["name"]
+        if name in names:
+            problems.append(f"intents[{n}]: duplicate intent {name!r}")
+        names.add(name)
+        if not intent.get("phrases") and not intent.get("exact"):
+            problems.append(f"intent {name!r}: has no 'phrases' or 'exact' triggers")
+        _check_phrases(f"intent {name!r} phrases", intent.get("phrases", []), problems)
+        _check_phrases(f"intent {name!r} exact", intent.get("exact", []), problems)
+        if name not in templates:
+            problems.append(f"intent {name!r}: no templates")
+
+    moods = data["moods"]
+    if not isinstance(moods, dict):
+        problems.append("moods: must be an object of name -> list")
+        moods = {}
+    for name in REQUIRED_MOODS:
+        if name not in moods:
+            problems.append(f"moods: missing {name!r}")
+    for name, words in moods.items():
+        if name in names:
+            problems.append(f"moods: {name!r} clashes with an intent name")
+        _check_phrases(f"mood {name!r}", words, problems)
+
+    followups = data["followups"]
+    if not isinstance(followups, dict):
+        problems.append("followups: must be an object of name -> phrase")
+        followups = {}
+    for name in REQUIRED_FOLLOWUPS:
+        if name not in followups:
+            problems.append(f"followups: missing {name!r}")
+    for name, phrase in followups.items():
+        _check_phrases(f"followup {name!r}", [phrase], problems)
+
+    for name in REQUIRED_TEMPLATES:
+        if name not in templates:
+            problems.append(f"templates: missing {name!r}")
+    for name, texts in templates.items():
+        if not isinstance(texts, list) or not texts:
+            problems.append(f"templates {name!r}: must be a non-empty list")
+            continue
+        if len(set(t for t in texts if isinstance(t, str))) != len(texts):
+            problems.append(f"templates {name!r}: duplicate template")
+        kinds = {_check_template(f"templates {name!r}", t, problems) for t in texts}
+        if len(kinds) > 1:
+            problems.append(f"templates {name!r}: either all or none of the templates may use {{text}}")
+    return problems
+
+
+# ========= DIFF =========
+
+def _diff_list(label, old, new, out):
+    old_set, new_set = set(old), set(new)
+    for item in old:
+        if item not in new_set:
+            out.append(f"- {label}: {item!r}")
+    for item in new:
+        if item not in old_set:
+            out.append(f"+ {label}: {item!r}")
+
+
+def diff_registries(old: IntentRegistry, new: IntentRegistry) -> list:
+    """Human-readable list of what changed between two registries."""
+    out = []
+    if old.version != new.version:
+        out.append(f"~ version: {old.version!r} -> {new.version!r}")
+    old_order = [i.name for i in old.intents]
+    new_order = [i.name for i in new.intents]
+    if old_order != new_order:
+        out.append(f"~ priority: {' > '.join(old_order)}  ->  {' > '.join(new_order)}")
+
+    old_intents = {i.name: i for i in old.intents}
+    new_intents = {i.name: i for i in new.intents}
+    for name in dict.fromkeys(old_order + new_order):
+        a, b = old_intents.get(name), new_intents.get(name)
+        _diff_list(f"phrase {name}", a.phrases if a else (), b.phrases if b else (), out)
+        _diff_list(f"exact {name}", sorted(a.exact) if a else (), sorted(b.exact) if b else (), out)
+
+    for name in dict.fromkeys(list(old.moods) + list(new.moods)):
+        _diff_list(f"mood {name}", old.moods.get(name, ()), new.moods.get(name, ()), out)
+
+    for name in dict.fromkeys(list(old.followups) + list(new.followups)):
+        a, b = old.followups.get(name), new.followups.get(name)
+        if a != b:
+            out.append(f"~ followup {name}: {a!r} -> {b!r}")
+
+    for name in dict.fromkeys(list(old.templates) + list(new.templates)):
+        a, b = old.templates.get(name), new.templates.get(name)
+        a_keys = dict(zip(a.keys, a.texts)) if a else {}
+        b_keys = dict(zip(b.keys, b.texts)) if b else {}
+        for key, text in a_keys.items():
+            if key not in b_keys:
+                out.append(f"- template {key}: {text[:60]!r}")
+        for key, text in b_keys.items():
+            if key not in a_keys:
+                out.append(f"+ template {key}: {text[:60]!r}")
+    return out
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if argv[:1] == ["validate"] and len(argv) <= 2:
+        path = argv[1] if len(argv) == 2 else DEFAULT_REGISTRY_PATH
+        with open(path, encoding="utf-8") as f:
+            problems = validate(json.load(f))
+        for p in problems:
+            print(p)
+        print(f"{path}: {'OK' if not problems else f'{len(problems)} problem(s)'}")
+        return 1 if problems else 0
+    if argv[:1] == ["diff"] and len(argv) == 3:
+        changes = diff_registries(load_registry(argv[1]), load_registry(argv[2]))
+        print("\n".join(changes) if changes else "no changes")
+        return 0
+    print("usage: intent_registry.py validate [path] | diff OLD NEW", file=sys.stderr)
+    return 2
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,508 @@
+"""
+Local load generator: many simulated users chatting at once.
+
+    python loadtest.py --target service --levels 1,8,32,128 --turns 12
+    python loadtest.py --target api                       # in-process HTTP server
+    python loadtest.py --target api --url http://127.0.0.1:8765
+    python loadtest.py --target streamlit --levels 1,4,16
+    python loadtest.py --target engine --json results.json
+
+Each simulated user opens a session and plays scripted conversations
+(greeting, venting, answering the bot's follow-up questions, goodbye;
+now and then a crisis message). Concurrency ramps through `--levels`;
+for every level it reports throughput, p50/p95/p99 reply latency and the
+error rate, plus the memory one session holds.
+
+Targets:
+    engine     respond() on per-user Conversations, one thread per user
+    service    ChatService.reply, the programmatic API (asyncio)
+    api        HTTP POST /sessions/<id>/messages, against --url or a
+               server started in this process
+    streamlit  mindmate.py under `streamlit run` (started here, or --url),
+               one websocket app session per user, like browser tabs
+
+Everything runs on one machine; nothing outside this process (and the
+Streamlit server it starts) is needed unless --url points at a running
+server.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+SCRIPTS = {
+    "check_in": [
+        "hi",
+        "honestly not great, work has been awful this week",
+        "my manager keeps piling things on and I can't say no",
+        "I guess talking to my sister helped a bit",
+        "thanks, that actually helps. bye",
+    ],
+    "venting": [
+        "hey",
+        "I feel so anxious about my exams",
+        "I can't sleep and everything feels like too much",
+        "I hate myself for falling behind",
+        "I wish someone would tell me it's going to be okay",
+        "ok I think I'll try to rest now, goodnight",
+    ],
+    "lonely": [
+        "hello",
+        "I've been feeling lonely since I moved",
+        "nobody texts me back and it hurts",
+        "I miss my friends from home",
+        "maybe I'll call one of them",
+        "bye",
+    ],
+    "good_day": [
+        "what's up",
+        "I had a really good day actually!",
+        "I finally finished my project and my team loved it",
+        "yeah I'm proud of myself",
+        "see you later",
+    ],
+    "small_talk": [
+        "sup",
+        "idk",
+        "i'm fine",
+        "ok",
+        "are you a bot?",
+        "bye",
+    ],
+}
+CRISIS_SCRIPT = ["hi", "I don't want to live anymore", "I don't know", "bye"]
+CRISIS_RATE = 0.02  # share of conversations that are crisis conversations
+
+
+def _user_messages(rnd):
+    """Endless stream of messages for one simulated user."""
+    names = sorted(SCRIPTS)
+    while True:
+        script = CRISIS_SCRIPT if rnd.random() < CRISIS_RATE else SCRIPTS[rnd.choice(names)]
+        yield from script
+
+
+def percentile(sorted_values, q):
+    """q-th percentile (0-100) of an already sorted list, nearest-rank."""
+    if not sorted_values:
+        return 0.0
+    k = max(0, min(len(sorted_values) - 1, round(q / 100 * len(sorted_values) + 0.5) - 1))
+    return sorted_values[k]
+
+
+# ========= TARGETS =========
+# async start(), open() -> session, send(session, text) -> reply text, close()
+
+class EngineTarget:
+    name = "engine"
+
+    def __init__(self, users):
+        from conversation import Conversation
+        from mindmate_engine import opening_message, warm_up
+
+        warm_up()
+        self._new = lambda: Conversation([("assistant", opening_message())], archive=None)
+        self._executor = ThreadPoolExecutor(max_workers=max(1, users))
+
+    async def start(self):
+        pass
+
+    async def open(self):
+        return self._new()
+
+    async def send(self, history, text):
+        from mindmate_engine import respond
+
+        def turn():
+            history.append("user", text)
+            reply = respond(text, history)
+            history.append("assistant", reply.text)
+            return reply.text
+        return await asyncio.get_running_loop().run_in_executor(self._executor, turn)
+
+    async def close(self):
+        self._executor.shutdown(wait=False)
+
+
+class ServiceTarget:
+    name = "service"
+
+    def __init__(self, users):
+        from mindmate_engine import warm_up
+        from mindmate_server import ChatService
+
+        warm_up()
+        self.service = ChatService(max_inflight=max(4, min(users, 64)), max_queued=100_000)
+
+    async def start(self):
+        pass
+
+    async def open(self):
+        return self.service.create_session()
+
+    async def send(self, session_id, text):
+        return (await self.service.reply(session_id, text)).text
+
+    async def close(self):
+        self.service.close()
+
+
+class ApiTarget:
+    name = "api"
+
+    def __init__(self, users, url=None):
+        self.url = url
+        self.users = users
+        self._server = None
+        if url:
+            parts = urlsplit(url)
+            self.host, self.port = parts.hostname, parts.port or 80
+        else:
+            self.host, self.port = "127.0.0.1", None
+
+    async def start(self):
+        if self.port is None:
+            from mindmate_engine import warm_up
+            from mindmate_server import ChatServer, ChatService
+
+            warm_up()
+            service = ChatService(max_inflight=max(4, min(self.users, 64)), max_queued=100_000)
+            self._server = ChatServer(service, host=self.host, port=0)
+            await self._server.start()
+            self.port = self._server.port
+
+    async def _request(self, method, path, body=None):
+        reader, writer = await asyncio.open_connection(self.host, self.port)
+        try:
+            data = b"" if body is None else json.dumps(body).encode("utf-8")
+            writer.write(
+                f"{method} {path} HTTP/1.1\r\nHost: {self.host}\r\n"
+                f"Content-Type: application/json\r\nContent-Length: {len(data)}\r\n"
+                "Connection: close\r\n\r\n".encode("latin-1") + data
+            )
+            await writer.drain()
+            head = (await reader.readuntil(b"\r\n\r\n")).decode("latin-1").split("\r\n")
+            status = int(head[0].split(" ")[1])
+            length = 0
+            for line in head[1:]:
+                if line.lower().startswith("content-length:"):
+                    length = int(line.split(":", 1)[1])
+            raw = await reader.readexactly(length) if length else b""
+        finally:
+            writer.close()
+        if status >= 400:
+            raise RuntimeError(f"HTTP {status}: {raw[:200]!r}")
+        return json.loads(raw) if raw else None
+
+    async def open(self):
+        return (await self._request("POST", "/sessions"))["session"]
+
+    async def send(self, session_id, text):
+        return (await self._request("POST", f"/sessions/{session_id}/messages", {"text": text}))["reply"]
+
+    async def close(self):
+        if self._server is not None:
+            await self._server.close()
+
+
+class StreamlitTarget:
+    """
+    A real `streamlit run mindmate.py` server (started here unless --url
+    is given), driven over Streamlit's websocket protocol the way a
+    browser tab is: one connection and app session per user, each
+    message sent as the chat_input widget's value on a script rerun.
+    """
+    name = "streamlit"
+
+    def __init__(self, users, url=None):
+        self.url = url
+        self.users = users
+        self.process = None
+        if url:
+            parts = urlsplit(url)
+            self.host, self.port = parts.hostname, parts.port or 80
+        else:
+            self.host, self.port = "127.0.0.1", _free_port()
+
+    @property
+    def pid(self):
+        return self.process.pid if self.process else None
+
+    async def start(self):
+        if self.url:
+            return
+        env = dict(os.environ, MINDMATE_PACING="off")  # measure the app, not the typing delay
+        self.process = subprocess.Popen(
+            [sys.executable, "-m", "streamlit", "run", os.path.join(HERE, "mindmate.py"),
+             "--server.headless=true", f"--server.address={self.host}",
+             f"--server.port={self.port}", "--browser.gatherUsageStats=false"],
+            env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        deadline = time.monotonic() + 60
+        while True:
+            try:
+                _reader, writer = await asyncio.open_connection(self.host, self.port)
+                writer.close()
+                return
+            except OSError:
+                if self.process.poll() is not None or time.monotonic() > deadline:
+                    raise RuntimeError("streamlit server did not start")
+                await asyncio.sleep(0.2)
+
+    async def _run_script(self, session, widgets=()):
+        from streamlit.proto.BackMsg_pb2 import BackMsg
+
+        msg = BackMsg()
+        msg.rerun_script.query_string = ""
+        msg.rerun_script.page_script_hash = session.page
+        msg.rerun_script.widget_states.widgets.extend(widgets)
+        await session.ws.send_bytes(msg.SerializeToString())
+        return await session.read_run()
+
+    async def open(self):
+        from mindmate_server import connect_websocket
+
+        ws = await connect_websocket(self.host, self.port, "/_stcore/stream",
+                                     subprotocol="streamlit", max_message=16 * 1024 * 1024)
+        session = _StreamlitSession(ws)
+        await self._run_script(session)
+        if session.chat_input is None:
+            raise RuntimeError("no chat_input on the page")
+        return session
+
+    async def send(self, session, text):
+        from streamlit.proto.WidgetStates_pb2 import WidgetState
+
+        widget = WidgetState(id=session.chat_input)
+        widget.chat_input_value.data = text
+        return await self._run_script(session, [widget])
+
+    async def close(self):
+        if self.process is not None:
+            self.process.terminate()
+            self.process.wait(10)
+
+
+class _StreamlitSession:
+    __slots__ = ("ws", "page", "chat_input")
+
+    def __init__(self, ws):
+        self.ws = ws
+        self.page = ""
+        self.chat_input = None
+
+    async def read_run(self):
+        """Read ForwardMsgs until the script run ends; returns the last markdown text."""
+        from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+
+        text = None
+        while True:
+            raw = await self.ws.receive_bytes()
+            if raw is None:
+                raise ConnectionError("streamlit closed the session")
+            msg = ForwardMsg()
+            msg.ParseFromString(raw)
+            kind = msg.WhichOneof("type")
+            if kind == "new_session":
+                self.page = self.page or msg.new_session.main_script_hash
+            elif kind == "delta" and msg.delta.WhichOneof("type") == "new_element":
+                element = msg.delta.new_element
+                which = element.WhichOneof("type")
+                if which == "chat_input":
+                    self.chat_input = element.chat_input.id
+                elif which == "markdown":
+                    text = element.markdown.body
+                elif which == "exception":
+                    raise RuntimeError(element.exception.message)
+            elif kind == "script_finished":
+                return text
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def make_target(name, users, url=None):
+    if name == "engine":
+        return EngineTarget(users)
+    if name == "service":
+        return ServiceTarget(users)
+    if name == "api":
+        return ApiTarget(users, url)
+    if name == "streamlit":
+        return StreamlitTarget(users, url)
+    raise ValueError(f"unknown target {name!r}")
+
+
+# ========= RUNNING =========
+
+async def _play(target, rnd, turns):
+    """One user, one session, `turns` messages; returns the session."""
+    session = await target.open()
+    messages = _user_messages(rnd)
+    for _ in range(turns):
+        await target.send(session, next(messages))
+    return session
+
+
+async def run_level(target, users, turns, seed=0):
+    """`users` concurrent users, `turns` messages each. Returns a result dict."""
+    latencies = []
+    errors = 0
+    first_error = None
+
+    async def user(i):
+        nonlocal errors, first_error
+        rnd = random.Random(f"{seed}:{users}:{i}")
+        messages = _user_messages(rnd)
+        try:
+            session = await target.open()
+        except Exception as exc:
+            errors += turns
+            first_error = first_error or repr(exc)
+            return
+        for _ in range(turns):
+            text = next(messages)
+            t0 = time.perf_counter()
+            try:
+                await target.send(session, text)
+            except Exception as exc:
+                errors += 1
+                first_error = first_error or repr(exc)
+                continue
+            latencies.append(time.perf_counter() - t0)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(user(i) for i in range(users)))
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    attempts = users * turns
+    return {
+        "users": users,
+        "replies": len(latencies),
+        "seconds": elapsed,
+        "throughput": len(latencies) / elapsed if elapsed else 0.0,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p95_ms": percentile(latencies, 95) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        "max_ms": (latencies[-1] if latencies else 0.0) * 1000,
+        "error_rate": errors / attempts if attempts else 0.0,
+        "first_error": first_error,
+    }
+
+
+async def session_memory(target, sessions=50, turns=12, seed=0):
+    """
+    Bytes of memory held per open session after `turns` messages each.
+    In-process targets count Python allocations (tracemalloc), server-side
+    state included; a Streamlit server started here counts its RSS growth.
+    A few sessions are played first so shared caches are not counted.
+    """
+    import gc
+
+    rnd = random.Random(seed)
+    for _ in range(3):
+        await _play(target, rnd, turns)
+    # `held` keeps every session open (engine histories, Streamlit websockets)
+    # until memory has been read; dropping them would let it be freed
+    pid = getattr(target, "pid", None)
+    if pid:
+        before = _rss(pid)
+        held = [await _play(target, rnd, turns) for _ in range(sessions)]
+        after = _rss(pid)
+        del held
+        return (after - before) / sessions
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    held = [await _play(target, rnd, turns) for _ in range(sessions)]
+    gc.collect()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del held
+    return (after - before) / sessions
+
+
+def _rss(pid):
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) * 1024
+    return 0
+
+
+async def run(target_name, levels, turns, url=None, memory_sessions=50, progress=None):
+    report = {"target": target_name, "turns_per_user": turns, "levels": []}
+    for users in levels:
+        target = make_target(target_name, users, url)
+        try:
+            await target.start()
+            await _play(target, random.Random(-1), turns)  # warm-up, not measured
+            result = await run_level(target, users, turns)
+        finally:
+            await target.close()
+        report["levels"].append(result)
+        if progress:
+            progress(result)
+    if memory_sessions and not url:
+        target = make_target(target_name, 1)
+        try:
+            await target.start()
+            report["bytes_per_session"] = await session_memory(target, memory_sessions, turns)
+        finally:
+            await target.close()
+    return report
+
+
+def _print_row(r):
+    print(f"{r['users']:>6} {r['replies']:>8} {r['throughput']:>10.1f} "
+          f"{r['p50_ms']:>9.2f} {r['p95_ms']:>9.2f} {r['p99_ms']:>9.2f} "
+          f"{r['error_rate'] * 100:>7.2f}%", flush=True)
+    if r["first_error"]:
+        print(f"       first error: {r['first_error']}", flush=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Simulate concurrent MindMate users")
+    parser.add_argument("--target", choices=("engine", "service", "api", "streamlit"),
+                        default="service")
+    parser.add_argument("--url", help="api/streamlit target: base URL of a server "
+                                      "that is already running")
+    parser.add_argument("--levels", default="1,4,16,64",
+                        help="comma-separated concurrent user counts to ramp through")
+    parser.add_argument("--turns", type=int, default=12, help="messages per user per level")
+    parser.add_argument("--memory-sessions", type=int, default=50,
+                        help="sessions opened to measure memory per session (0 skips)")
+    parser.add_argument("--json", help="also write the report to this file")
+    args = parser.parse_args(argv)
+    levels = [int(n) for n in args.levels.split(",") if n.strip()]
+
+    print(f"target: {args.target}{' ' + args.url if args.url else ''}, {args.turns} turns per user")
+    print(f"{'users':>6} {'replies':>8} {'replies/s':>10} {'p50 ms':>9} {'p95 ms':>9} "
+          f"{'p99 ms':>9} {'errors':>8}")
+    report = asyncio.run(run(args.target, levels, args.turns, args.url,
+                             args.memory_sessions, _print_row))
+    if "bytes_per_session" in report:
+        print(f"memory per session: {report['bytes_per_session'] / 1024:.1f} KiB "
+              f"(after {args.turns} messages)")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+            f.write("\n")
+    return 1 if any(r["error_rate"] for r in report["levels"]) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,251 @@
+"""
+In-process metrics, exposed in Prometheus text format (standard library only).
+
+    import metrics
+    if metrics.ENABLED:
+        metrics.REPLIES.inc(intent="greeting")
+
+The reply engine records per-stage timings (phrase matching, VADER
+scoring, template selection), replies per intent and sentiment bucket,
+and histograms of message length and reply latency; the chat page adds
+its transcript render and reply streaming times. `render()` gives the
+exposition text, served at /metrics by mindmate_server.py or by `serve()`
+on a port of its own.
+
+MINDMATE_METRICS=off turns everything off: call sites check `ENABLED`
+before touching the clock, so a disabled build pays one global lookup.
+"""
+import os
+import threading
+from bisect import bisect_left
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+ENABLED = os.environ.get("MINDMATE_METRICS", "").lower() not in ("off", "0", "false", "none")
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+_metrics = []
+
+
+def _labels(names, values):
+    if not names:
+        return ""
+    pairs = ",".join(f'{n}="{_escape(v)}"' for n, v in zip(names, values))
+    return "{" + pairs + "}"
+
+
+def _escape(value):
+    return str(value).replace("\\", r"\\").replace("\n", r"\n").replace('"', r"\"")
+
+
+def _number(x):
+    if x == float("inf"):
+        return "+Inf"
+    return repr(float(x)) if isinstance(x, float) else str(x)
+
+
+class _Count:
+    """One labeled series of a Counter."""
+    __slots__ = ("value", "_lock")
+
+    def __init__(self):
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+
+class Counter:
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._series = {}  # label values -> _Count
+        self._lock = threading.Lock()
+        _metrics.append(self)
+
+    def labels(self, *values):
+        series = self._series.get(values)
+        if series is None:
+            with self._lock:
+                series = self._series.setdefault(values, _Count())
+        return series
+
+    def inc(self, amount=1, **labels):
+        self.labels(*(labels[n] for n in self.labelnames)).inc(amount)
+
+    def value(self, **labels):
+        series = self._series.get(tuple(labels[n] for n in self.labelnames))
+        return series.value if series else 0
+
+    def expose(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            items = sorted(self._series.items())
+        for key, series in items:
+            lines.append(f"{self.name}{_labels(self.labelnames, key)} {_number(series.value)}")
+        return lines
+
+
+class Gauge:
+    """A value read when metrics are rendered, from `set()` or a callback."""
+
+    def __init__(self, name, help, function=None):
+        self.name = name
+        self.help = help
+        self.function = function
+        self._value = 0
+        _metrics.append(self)
+
+    def set(self, value):
+        self._value = value
+
+    def value(self):
+        return self.function() if self.function is not None else self._value
+
+    def expose(self):
+        return [
+            f"# HELP {self.name} {self.help}",
+            f"# TYPE {self.name} gauge",
+            f"{self.name} {_number(self.value())}",
+        ]
+
+
+class _Buckets:
+    """One labeled series of a Histogram."""
+    __slots__ = ("bounds", "counts", "sum", "_lock")
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * len(bounds)
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        i = bisect_left(self.bounds, value)
+        with self._lock:
+            self.counts[i] += 1
+            self.sum += value
+
+
+class Histogram:
+    def __init__(self, name, help, buckets, labelnames=()):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+        self.labelnames = tuple(labelnames)
+        self._series = {}  # label values -> _Buckets
+        self._lock = threading.Lock()
+        _metrics.append(self)
+
+    def labels(self, *values):
+        """The series for these label values; hot paths keep it around."""
+        series = self._series.get(values)
+        if series is None:
+            with self._lock:
+                series = self._series.setdefault(values, _Buckets(self.buckets))
+        return series
+
+    def observe(self, value, **labels):
+        self.labels(*(labels[n] for n in self.labelnames)).observe(value)
+
+    def count(self, **labels):
+        series = self._series.get(tuple(labels[n] for n in self.labelnames))
+        return sum(series.counts) if series else 0
+
+    def expose(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = sorted(self._series.items())
+        for key, series in items:
+            with series._lock:
+                counts, total = list(series.counts), series.sum
+            cumulative = 0
+            for bound, n in zip(self.buckets, counts):
+                cumulative += n
+                labels = _labels(self.labelnames + ("le",), key + (_number(bound),))
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_number(total)}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+def render() -> str:
+    """Every metric in Prometheus text exposition format."""
+    lines = []
+    for metric in _metrics:
+        lines.extend(metric.expose())
+    return "\n".join(lines) + "\n"
+
+
+# ========= MINDMATE METRICS =========
+
+_LATENCY_BUCKETS = (
+    0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005,
+    0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5,
+)
+
+STAGE_SECONDS = Histogram(
+    "mindmate_stage_seconds",
+    "Time spent in each stage of a turn (match, sentiment, select, render, stream).",
+    _LATENCY_BUCKETS, ("stage",),
+)
+REPLY_SECONDS = Histogram(
+    "mindmate_reply_seconds", "Time to produce a reply, end to end in the engine.",
+    _LATENCY_BUCKETS,
+)
+MESSAGE_CHARS = Histogram(
+    "mindmate_message_chars", "Length of user messages in characters.",
+    (8, 16, 32, 64, 128, 256, 512, 1024, 2048, 4096),
+)
+REPLIES = Counter(
+    "mindmate_replies_total",
+    "Replies by the branch that produced them (template group; risk = crisis).",
+    ("intent",),
+)
+SENT_LABELS = Counter(
+    "mindmate_sent_labels_total",
+    "Replies chosen from a sentiment bucket, by bucket.",
+    ("sent_label",),
+)
+
+# crisis event pipeline (crisis_events.py)
+CRISIS_EVENTS = Counter(
+    "mindmate_crisis_events_total",
+    "Crisis events by outcome (queued, logged, delivered, dropped, failed).",
+    ("outcome",),
+)
+CRISIS_QUEUE = Gauge("mindmate_crisis_queue_depth", "Crisis events waiting for the worker.")
+CRISIS_LAG = Histogram(
+    "mindmate_crisis_lag_seconds",
+    "Time from a crisis reply to its event being written to the local log.",
+    _LATENCY_BUCKETS + (5.0, 10.0, 30.0, 60.0),
+)
+
+
+# ========= STANDALONE ENDPOINT =========
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0].rstrip("/") != "/metrics":
+            self.send_error(404)
+            return
+        body = render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(port, host="127.0.0.1"):
+    """Serve /metrics from a daemon thread (for processes without an HTTP server)."""
+    server = ThreadingHTTPServer((host, port), _Handler)
+    threading.Thread(target=server.serve_forever, name="mindmate-metrics", daemon=True).start()
+    return server
@@ -0,0 +1,368 @@
+"""
+MindMate reply engine.
+
+Everything needed to turn a user message into a reply, without any
+Streamlit dependency, so it can be imported by the UI, workers, tests
+and batch jobs alike. The VADER analyzer is only built on first use.
+"""
+import functools
+import os
+import random
+import threading
+import time
+from typing import NamedTuple
+
+import metrics
+from intent_registry import DEFAULT_REGISTRY_PATH, RegistryWatcher, load_registry
+
+# ========= SENTIMENT =========
+
+_analyzer = None
+_analyzer_lock = threading.Lock()
+
+
+def get_analyzer():
+    """Shared VADER analyzer, created (and its lexicon loaded) on first call."""
+    global _analyzer
+    if _analyzer is None:
+        with _analyzer_lock:
+            if _analyzer is None:
+                from vaderSentiment.vaderSentiment import SentimentIntensityAnalyzer
+                _analyzer = SentimentIntensityAnalyzer()
+    return _analyzer
+
+
+def warm_up() -> None:
+    """Pay the one-off setup cost (VADER lexicon) up front, e.g. at worker start."""
+    get_analyzer().polarity_scores("hello")
+
+
+# Short messages ("hi", "idk", "ok", "i'm fine") repeat a lot across
+# sessions, so their scores are memoized process-wide. The key keeps case
+# and punctuation (VADER scores CAPS and "!!!" differently) but not
+# whitespace, which VADER ignores. Long texts are rarely repeated and
+# would only push the short ones out, so they are not cached.
+SENTIMENT_CACHE_SIZE = int(os.environ.get("MINDMATE_SENTIMENT_CACHE", "50000"))
+SENTIMENT_CACHE_MAX_CHARS = 256
+
+
+@functools.lru_cache(maxsize=SENTIMENT_CACHE_SIZE)
+def _cached_scores(key):
+    return get_analyzer().polarity_scores(key)
+
+
+def sentiment_scores(text: str) -> dict:
+    """VADER polarity scores for `text` (shared dict, don't modify it)."""
+    key = " ".join(text.split())
+    if len(key) > SENTIMENT_CACHE_MAX_CHARS:
+        return get_analyzer().polarity_scores(key)
+    return _cached_scores(key)
+
+
+def sentiment_cache_info() -> dict:
+    """hits, misses, maxsize and currsize of the sentiment memo."""
+    return _cached_scores.cache_info()._asdict()
+
+
+# ========= INTENTS & TEMPLATES =========
+# Trigger phrases, priority order and reply templates live in intents.json
+# (see intent_registry.py); compiled once here. The active registry is a
+# single module reference: every reply reads it once, and a hot reload
+# replaces it in one assignment.
+_registry = load_registry()
+_watcher = None
+_watcher_lock = threading.Lock()
+
+
+def active_registry():
+    return _registry
+
+
+def set_registry(registry) -> None:
+    global _registry
+    _registry = registry
+
+
+def enable_hot_reload(path=DEFAULT_REGISTRY_PATH, interval=1.0):
+    """Start (once per process) watching the pack file and swapping in new versions."""
+    global _watcher
+    with _watcher_lock:
+        if _watcher is None:
+            _watcher = RegistryWatcher(path, set_registry, interval, current=_registry).start()
+    return _watcher
+
+
+def opening_message() -> str:
+    return _registry.opening_message
+
+
+def check_risk(text) -> bool:
+    if isinstance(text, Utterance):
+        return "risk" in text.hits
+    return "risk" in _registry.matcher.match(text.lower())
+
+
+def crisis_reply() -> str:
+    return _registry.crisis_message
+
+
+# ========= UTTERANCE ANALYSIS =========
+
+_MATCH_SECONDS = metrics.STAGE_SECONDS.labels("match")
+_SENTIMENT_SECONDS = metrics.STAGE_SECONDS.labels("sentiment")
+_SELECT_SECONDS = metrics.STAGE_SECONDS.labels("select")
+_REPLY_SECONDS = metrics.REPLY_SECONDS.labels()
+_MESSAGE_CHARS = metrics.MESSAGE_CHARS.labels()
+
+
+class Utterance:
+    """
+    One user message, normalized, scanned and scored once; every stage of
+    the reply reads it from here instead of redoing the work.
+    """
+    __slots__ = ("text", "lower", "hits", "scores", "compound", "registry")
+
+    def __init__(self, text, lower, hits, scores, compound, registry):
+        self.text = text  # stripped message
+        self.lower = lower
+        self.hits = hits  # names of matched phrase groups (intents, moods, follow-ups)
+        self.scores = scores  # VADER dict, None when the compound was given
+        self.compound = compound
+        self.registry = registry  # intent pack the hits came from
+
+
+def analyze(user_text: str, registry=None, compound=None) -> Utterance:
+    """
+    Analyze `user_text` against `registry` (the active one by default).
+    Pass `compound` when it was already scored, e.g. by batch_sentiment.
+    """
+    registry = registry or _registry
+    text = user_text.strip()
+    lower = text.lower()
+    timed = metrics.ENABLED
+    if timed:
+        t0 = time.perf_counter()
+    hits = registry.matcher.match(lower)
+    if timed:
+        t1 = time.perf_counter()
+        _MATCH_SECONDS.observe(t1 - t0)
+    if compound is None:
+        scores = sentiment_scores(text)
+        compound = scores["compound"]
+        if timed:
+            _SENTIMENT_SECONDS.observe(time.perf_counter() - t1)
+    else:
+        scores = None
+    return Utterance(text, lower, hits, scores, compound, registry)
+
+
+def restore_mood(history) -> None:
+    """
+    Rebuild `history.mood` from its retained user turns, once, for a
+    conversation loaded back from storage (replies keep it current after).
+    """
+    mood = history.mood
+    for role, text in history:
+        if role == "user":
+            utt = analyze(text)
+            mood.update(utt.compound, utt.hits)
+
+
+# ========= HELPER =========
+
+def _last_assistant(history):
+    """
+    Most recent assistant message. `history` is either a Conversation
+    (tracks it directly) or a plain list of (role, text) pairs.
+    """
+    if hasattr(history, "last_assistant"):
+        return history.last_assistant
+    for role, msg in reversed(history):
+        if role == "assistant":
+            return msg
+    return None
+
+
+def _pick_non_repeating(group, history, text=None):
+    """
+    Pick a reply from a TemplateGroup. A Conversation's selector keeps it
+    clear of the group's last few replies in O(1); with a plain list of
+    turns it only avoids repeating the last assistant message.
+    """
+    selector = getattr(history, "selector", None)
+    if selector is not None:
+        return group.render(selector.pick(group, history), text)
+
+    last_bot = _last_assistant(history)
+    if last_bot:
+        last_bot = last_bot.strip()
+
+    n = len(group)
+    skip = group.position(last_bot, text) if last_bot else None
+    if skip is None or n == 1:
+        i = random.randrange(n)
+    else:
+        # uniform over the other n - 1 templates, without building a list
+        i = random.randrange(n - 1)
+        if i >= skip:
+            i += 1
+    return group.render(i, text)
+
+
+# ========= MAIN REPLY LOGIC =========
+
+class Reply(NamedTuple):
+    text: str
+    intent: str  # template group the reply came from ("risk", "greeting", "heavy", ...)
+    sent_label: str  # VADER bucket, "" when an intent matched before sentiment was used
+    compound: float
+    pack_version: str  # version of the intent pack that produced it
+    registry: object  # that IntentRegistry (its matcher names the phrases that hit)
+
+
+def supportive_reply(user_text: str, history, compound=None) -> str:
+    return respond(user_text, history, compound).text
+
+
+def respond(user_text, history, compound=None) -> Reply:
+    """
+    Human-ish supportive reply, plus how it was chosen:
+    - Crisis check first
+    - Then the registry's intents in priority order (goodbye, greetings,
+      small-talk, sick, confusion, insults, self-criticism)
+    - Then contextual follow-ups
+    - Then emotion-based responses from VADER, pointing to support
+      resources when the conversation's mood has stayed low for a while
+
+    A history with a `mood` (Conversation) gets this message folded in.
+    `user_text` is a string or an Utterance from analyze(). `compound` is
+    the VADER compound score of a string `user_text` when the caller
+    already has it (batch_sentiment scores many texts at once).
+    """
+    timed = metrics.ENABLED
+    if timed:
+        t0 = time.perf_counter()
+    if isinstance(user_text, Utterance):
+        utt = user_text
+    else:
+        # one pack for the whole reply, even across a reload
+        utt = analyze(user_text, _registry, compound)
+    mood = getattr(history, "mood", None)
+    if mood is not None:
+        mood.update(utt.compound, utt.hits)
+    if not timed:
+        return _choose_reply(utt, history)
+
+    t1 = time.perf_counter()
+    reply = _choose_reply(utt, history)
+    t2 = time.perf_counter()
+    _SELECT_SECONDS.observe(t2 - t1)
+    _REPLY_SECONDS.observe(t2 - t0)
+    _MESSAGE_CHARS.observe(len(utt.text))
+    metrics.REPLIES.labels(reply.intent).inc()
+    if reply.sent_label:
+        metrics.SENT_LABELS.labels(reply.sent_label).inc()
+    return reply
+
+
+def _choose_reply(utt, history) -> Reply:
+    text = utt.text
+    lower = utt.lower
+    registry = utt.registry
+    templates = registry.templates
+    version = registry.version
+
+    # Last assistant message (for context)
+    last_bot = _last_assistant(history)
+    if last_bot:
+        last_bot = last_bot.lower()
+
+    comp = utt.compound
+    hits = utt.hits
+
+    # ---------- 1. CRISIS / RISK FIRST ----------
+    if "risk" in hits:
+        return Reply(registry.crisis_message, "risk", "", comp, version, registry)
+
+    # ---------- 2-4. GOODBYE, QUICK INTENTS, SELF-CRITICISM ----------
+    for intent in registry.priority:
+        if intent.name in hits or lower in intent.exact:
+            reply = _pick_non_repeating(templates[intent.name], history)
+            return Reply(reply, intent.name, "", comp, version, registry)
+
+    # ---------- 5. CONTEXTUAL FOLLOW-UPS ----------
+    if last_bot:
+        followups = registry.followups
+
+        # If bot just asked: “What do you think helped most?”
+        if followups["helped_most"] in last_bot:
+            reply = _pick_non_repeating(templates["helped_most"], history, text)
+            return Reply(reply, "helped_most", "", comp, version, registry)
+
+        # If bot just asked: “What keeps circling in your mind the most today?”
+        if followups["circling"] in last_bot:
+            # make it light if the reply is positive
+            if comp >= 0.2:
+                group = templates["circling_positive"]
+            else:
+                group = templates["circling_negative"]
+            reply = _pick_non_repeating(group, history, text)
+            return Reply(reply, group.name, "", comp, version, registry)
+
+        # If bot just asked: “What’s one thing you wish someone would say to you right now?”
+        if followups["wish"] in last_bot:
+            if "self_criticism" in hits:
+                group = templates["wish_self_critical"]
+            else:
+                group = templates["wish"]
+            reply = _pick_non_repeating(group, history, text)
+            return Reply(reply, group.name, "", comp, version, registry)
+
+    # ---------- 6. SENTIMENT & FEELINGS BUCKETS ----------
+    if comp <= -0.5:
+        sent_label = "very_negative"
+    elif comp <= -0.2:
+        sent_label = "negative"
+    elif comp < 0.05:
+        sent_label = "mixed"
+    elif comp < 0.6:
+        sent_label = "positive"
+    else:
+        sent_label = "very_positive"
+
+    # very low mood / heavy
+    if sent_label in ("very_negative", "negative"):
+        mood = getattr(history, "mood", None)
+        if mood is not None and mood.sustained_low() and "sustained_low" in templates:
+            # low for many messages in a row: point to real support
+            group = templates["sustained_low"]
+        elif "anxious" in hits:
+            group = templates["anxious"]
+        elif "lonely" in hits:
+            group = templates["lonely"]
+        elif "overwhelmed" in hits:
+            group = templates["overwhelmed"]
+        else:
+            group = templates["heavy"]
+    # mixed / meh
+    elif sent_label == "mixed":
+        group = templates["mixed"]
+    # positive / good
+    elif sent_label in ("positive", "very_positive"):
+        group = templates["positive"]
+    # fallback
+    else:
+        group = templates["fallback"]
+    reply = _pick_non_repeating(group, history)
+    return Reply(reply, group.name, sent_label, comp, version, registry)
+
+
+if __name__ == "__main__":
+    # cold-start timings: python -X importtime is finer grained, this is the quick view
+    t0 = time.perf_counter()
+    warm_up()
+    t1 = time.perf_counter()
+    supportive_reply("I had a long day but I'm okay", [])
+    t2 = time.perf_counter()
+    print(f"analyzer setup: {(t1 - t0) * 1000:.1f} ms")
+    print(f"first reply:    {(t2 - t1) * 1000:.1f} ms")
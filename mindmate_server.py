@@ -0,0 +1,871 @@
+"""
+Asyncio HTTP + WebSocket chat API for MindMate (standard library only).
+
+    python mindmate_server.py --port 8765
+
+HTTP (JSON bodies):
+    POST   /sessions                  -> {"session": id, "reply": opening message}
+    POST   /sessions/<id>/messages    {"text": ...} -> {"session": id, "reply": ..., "intent": ..., "pack": ...}
+    GET    /sessions/<id>             -> {"session": id, "history": [[role, text], ...]}
+    DELETE /sessions/<id>
+    GET    /sessions/<id>/mood        -> {"session": id, "mood": rolling mood state}
+    GET    /analytics/mood            -> mood aggregated over live sessions
+    GET    /healthz
+    GET    /metrics                   -> Prometheus text format (see metrics.py)
+
+WebSocket:
+    GET /ws or /ws?session=<id>   first frame is {"session": id, "reply": ...},
+    then every {"text": ...} frame gets {"reply": ..., "intent": ..., "pack": ...}
+    back (preceded by {"delta": ...} frames when pacing is enabled).
+
+"pack" is the version of the intent pack (intents.json) that produced the
+reply; the pack file is watched and reloaded without a restart.
+
+With --session-db (or MINDMATE_SESSION_DB) sessions are kept in a SQLite
+file (session_store.py), so they survive restarts and any worker sharing
+the file can continue them. With MINDMATE_CRISIS_LOG set, crisis replies
+are recorded for review (crisis_events.py; MINDMATE_CRISIS_WEBHOOK also
+forwards them).
+
+Replies are computed in an executor so VADER scoring never runs on the
+event loop. A bounded number of replies run at once; past that, requests
+wait in a bounded queue and are rejected with 503 when it is full.
+Short messages get their sentiment from the engine's process-wide memo;
+longer ones arriving together are scored as one batch (SentimentBatcher,
+batch_sentiment.py) before their replies are picked.
+"""
+import argparse
+import asyncio
+import base64
+import hashlib
+import json
+import logging
+import os
+import struct
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs, urlsplit
+
+from batch_sentiment import BatchSentimentScorer
+import metrics
+from conversation import Conversation
+from crisis_events import CONTEXT_TURNS, pipeline_from_env
+from mindmate_engine import (
+    SENTIMENT_CACHE_MAX_CHARS, enable_hot_reload, opening_message,
+    respond, restore_mood, sentiment_cache_info, warm_up,
+)
+from mood import summarize
+from pacing import NO_PACING, astream_reply
+from session_store import SQLiteStore
+
+log = logging.getLogger(__name__)
+
+_WS_GUID = b"258EAFA5-E914-47DA-95CA-C5AB0DC11B65"
+
+_REASONS = {
+    200: "OK", 201: "Created", 204: "No Content", 400: "Bad Request",
+    404: "Not Found", 405: "Method Not Allowed", 408: "Request Timeout",
+    413: "Payload Too Large", 426: "Upgrade Required",
+    500: "Internal Server Error", 503: "Service Unavailable", 504: "Gateway Timeout",
+}
+
+
+class _PlainText:
+    """A route result sent as-is instead of as JSON."""
+    __slots__ = ("text", "content_type")
+
+    def __init__(self, text, content_type="text/plain; charset=utf-8"):
+        self.text = text
+        self.content_type = content_type
+
+
+class Overloaded(Exception):
+    """Too many replies are already running or queued."""
+
+
+class UnknownSession(KeyError):
+    """No live or stored session has this ID."""
+
+
+class _Session:
+    __slots__ = ("history", "lock", "last_seen")
+
+    def __init__(self, window, turns):
+        # turns past the window are dropped; the API keeps no archive
+        self.history = Conversation(turns, window=window, archive=None)
+        self.lock = asyncio.Lock()
+        self.last_seen = time.monotonic()
+
+
+# ========= CHAT SERVICE =========
+
+class SentimentBatcher:
+    """
+    Micro-batches sentiment scoring across concurrent replies: texts are
+    collected for up to `window` seconds (or until `max_batch` are waiting)
+    and scored with one BatchSentimentScorer call in the executor.
+    """
+
+    def __init__(self, executor, max_batch=64, window=0.002, scorer=None):
+        self.max_batch = max_batch
+        self.window = window
+        self._executor = executor
+        self._scorer = scorer or BatchSentimentScorer()
+        self._pending = []  # (text, future)
+        self._timer = None
+
+    async def compound(self, text: str) -> float:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((text, future))
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window, self._flush)
+        return await future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if not batch:
+            return
+        loop = asyncio.get_running_loop()
+        scored = loop.run_in_executor(
+            self._executor, self._scorer.compound_many, [text for text, _ in batch]
+        )
+        scored.add_done_callback(lambda f: self._resolve(batch, f))
+
+    @staticmethod
+    def _resolve(batch, scored):
+        exc = scored.exception() if not scored.cancelled() else asyncio.CancelledError()
+        results = scored.result() if exc is None else [None] * len(batch)
+        for (_, future), compound in zip(batch, results):
+            if future.done():  # caller timed out
+                continue
+            if exc is None:
+                future.set_result(compound)
+            else:
+                future.set_exception(exc)
+
+
+class ChatService:
+    """
+    Sessions plus the reply path. Independent of the transport, so the
+    HTTP and WebSocket handlers (and anything embedding this) share it.
+    """
+
+    def __init__(self, max_inflight=32, max_queued=1024, reply_timeout=5.0,
+                 session_ttl=3600.0, max_sessions=100_000, history_window=200,
+                 executor=None, sentiment_batch=64, batch_window=0.002, store=None,
+                 crisis=None):
+        self.max_inflight = max_inflight
+        self.max_queued = max_queued
+        self.reply_timeout = reply_timeout
+        self.session_ttl = session_ttl
+        self.max_sessions = max_sessions
+        self.history_window = history_window
+        self.sessions = {}
+        # optional session_store backend: sessions survive restarts and are
+        # shared with other workers; evicted or unknown sessions load from it
+        self.store = store
+        self.crisis = crisis  # crisis_events.CrisisPipeline, None keeps no record
+        self._executor = executor or ThreadPoolExecutor(
+            max_workers=max_inflight, thread_name_prefix="mindmate-reply"
+        )
+        self._own_executor = executor is None
+        # sentiment_batch=0 scores every message on its own inside respond()
+        self._batcher = (
+            SentimentBatcher(self._executor, sentiment_batch, batch_window)
+            if sentiment_batch else None
+        )
+        self._slots = None
+        self._waiting = 0
+
+    def create_session(self) -> str:
+        if len(self.sessions) >= self.max_sessions:
+            self.evict_idle()
+            if len(self.sessions) >= self.max_sessions:
+                raise Overloaded("session limit reached")
+        session_id = uuid.uuid4().hex
+        turns = [("assistant", opening_message())]
+        self.sessions[session_id] = _Session(self.history_window, turns)
+        if self.store is not None:
+            self.store.create(session_id, turns)
+        return session_id
+
+    def _session(self, session_id) -> _Session:
+        """
+        The live session, loaded from the store if needed (blocking; the
+        event loop goes through open_session first). UnknownSession if unknown.
+        """
+        session = self.sessions.get(session_id)
+        if session is None and self.store is not None:
+            session = self._load(session_id)
+            if session is not None:
+                session = self.sessions.setdefault(session_id, session)
+        if session is None:
+            raise UnknownSession(session_id)
+        return session
+
+    def _load(self, session_id):
+        turns = self.store.load(session_id)
+        if turns is None:
+            return None
+        session = _Session(self.history_window, turns)
+        restore_mood(session.history)
+        return session
+
+    async def open_session(self, session_id) -> bool:
+        """
+        Make `session_id` live, False if it is unknown. A session that is
+        only in the store is loaded (a store read plus a sentiment pass over
+        its turns) in the executor, off the event loop.
+        """
+        if session_id in self.sessions:
+            return True
+        if self.store is None:
+            return False
+        loop = asyncio.get_running_loop()
+        session = await loop.run_in_executor(self._executor, self._load, session_id)
+        if session is None:
+            return False
+        self.sessions.setdefault(session_id, session)
+        return True
+
+    def has_session(self, session_id) -> bool:
+        try:
+            self._session(session_id)
+        except UnknownSession:
+            return False
+        return True
+
+    def get_history(self, session_id):
+        return self._session(session_id).history.to_list()
+
+    def get_mood(self, session_id) -> dict:
+        return self._session(session_id).history.mood.to_dict()
+
+    def mood_summary(self) -> dict:
+        """Mood aggregated over the sessions held in memory."""
+        return summarize(s.history.mood for s in list(self.sessions.values()))
+
+    def drop_session(self, session_id) -> bool:
+        dropped = self.sessions.pop(session_id, None) is not None
+        if self.store is not None:
+            dropped = self.store.delete(session_id) or dropped
+        return dropped
+
+    def evict_idle(self) -> int:
+        """Drop sessions idle for longer than `session_ttl` (from memory; the store keeps them)."""
+        cutoff = time.monotonic() - self.session_ttl
+        stale = [
+            sid for sid, s in self.sessions.items()
+            if s.last_seen < cutoff and not s.lock.locked()
+        ]
+        for sid in stale:
+            del self.sessions[sid]
+        return len(stale)
+
+    async def reply(self, session_id: str, text: str):
+        """
+        Reply (a mindmate_engine.Reply) to `text` in `session_id`. Raises UnknownSession
+        for unknown sessions, Overloaded when the queue is full and
+        asyncio.TimeoutError when there is no reply within `reply_timeout`,
+        waiting for the session and for a free slot included (a reply that
+        had started keeps the session busy until it is done, and is still
+        recorded).
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.reply_timeout
+        if not await self.open_session(session_id):
+            raise UnknownSession(session_id)
+        session = self.sessions[session_id]
+        session.last_seen = time.monotonic()
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_inflight)
+        if self._slots.locked() and self._waiting >= self.max_queued:
+            raise Overloaded("too many pending replies")
+
+        # one message at a time per session, so history stays ordered
+        await _acquire(session.lock, deadline - loop.time())
+        try:
+            self._waiting += 1
+            try:
+                await _acquire(self._slots, deadline - loop.time())
+            finally:
+                self._waiting -= 1
+        except BaseException:
+            session.lock.release()
+            raise
+        try:
+            if self.sessions.get(session_id) is not session:
+                raise UnknownSession(session_id)  # deleted while this message waited
+            session.history.append("user", text)
+            if self.store is not None:
+                self.store.append(session_id, "user", text)
+            work = asyncio.ensure_future(self._respond(text, session.history))
+        except BaseException:
+            self._slots.release()
+            session.lock.release()
+            raise
+        try:
+            bot_reply = await asyncio.wait_for(asyncio.shield(work), deadline - loop.time())
+        except BaseException:
+            # the worker thread goes on using the history (turns, mood,
+            # template decks) until respond() returns, so the session stays
+            # locked until then and the late reply is still recorded
+            work.add_done_callback(lambda done: self._finish(session_id, session, text, done))
+            raise
+        self._finish(session_id, session, text, work)
+        return bot_reply
+
+    def _finish(self, session_id, session, text, work):
+        """Record a finished reply and release the session (also runs for replies that timed out)."""
+        try:
+            if work.cancelled() or work.exception() is not None:
+                return
+            bot_reply = work.result()
+            session.history.append("assistant", bot_reply.text)
+            # a session deleted while the reply ran must not be written back
+            if self.store is not None and self.sessions.get(session_id) is session:
+                self.store.append(
+                    session_id, "assistant", bot_reply.text, pack=bot_reply.pack_version
+                )
+            if bot_reply.intent == "risk" and self.crisis is not None:
+                total = session.history.total
+                self.crisis.submit(
+                    session_id, text,
+                    session.history.turns(total - CONTEXT_TURNS, total), bot_reply.registry,
+                )
+            session.last_seen = time.monotonic()
+        finally:
+            self._slots.release()
+            session.lock.release()
+
+    async def _respond(self, text, history):
+        compound = None
+        if self._batcher and len(text) > SENTIMENT_CACHE_MAX_CHARS:
+            compound = await self._batcher.compound(text)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, respond, text, history, compound)
+
+    def close(self):
+        if self._own_executor:
+            self._executor.shutdown(wait=False)
+
+
+async def _acquire(lock, timeout):
+    """Acquire an asyncio Lock or Semaphore, raising asyncio.TimeoutError after `timeout` seconds."""
+    if not lock.locked():
+        await lock.acquire()  # free: no timer needed
+    else:
+        await asyncio.wait_for(lock.acquire(), timeout)
+
+
+# ========= HTTP / WEBSOCKET SERVER =========
+
+class _HttpError(Exception):
+    def __init__(self, status, message=None):
+        super().__init__(message or _REASONS.get(status, ""))
+        self.status = status
+
+
+class ChatServer:
+    def __init__(self, service=None, host="127.0.0.1", port=8765,
+                 read_timeout=30.0, idle_timeout=300.0, max_body=64 * 1024,
+                 pacing=NO_PACING, sweep_interval=60.0):
+        self.service = service or ChatService()
+        self.host = host
+        self.port = port
+        self.read_timeout = read_timeout
+        self.idle_timeout = idle_timeout
+        self.max_body = max_body
+        self.pacing = pacing
+        self.sweep_interval = sweep_interval
+        self._server = None
+        self._sweeper = None
+        self._connections = {}  # writer -> handler task
+
+    async def start(self):
+        self._server = await asyncio.start_server(
+            self._handle_connection, self.host, self.port, limit=self.max_body
+        )
+        self.port = self._server.sockets[0].getsockname()[1]
+        self._sweeper = asyncio.create_task(self._sweep_sessions())
+        return self
+
+    async def close(self):
+        if self._sweeper:
+            self._sweeper.cancel()
+        if self._server:
+            self._server.close()
+            for writer in list(self._connections):
+                writer.close()
+            await asyncio.gather(*self._connections.values(), return_exceptions=True)
+            await self._server.wait_closed()
+        self.service.close()
+
+    async def serve_forever(self):
+        await self.start()
+        async with self._server:
+            await self._server.serve_forever()
+
+    async def _sweep_sessions(self):
+        while True:
+            await asyncio.sleep(self.sweep_interval)
+            self.service.evict_idle()
+
+    # ----- connection handling -----
+
+    async def _handle_connection(self, reader, writer):
+        self._connections[writer] = asyncio.current_task()
+        try:
+            while True:
+                try:
+                    head = await asyncio.wait_for(
+                        reader.readuntil(b"\r\n\r\n"), self.idle_timeout
+                    )
+                except (asyncio.IncompleteReadError, asyncio.TimeoutError):
+                    return
+                except asyncio.LimitOverrunError:
+                    await self._send_json(writer, 413, {"error": "headers too large"}, close=True)
+                    return
+                try:
+                    method, target, headers = _parse_head(head)
+                except _HttpError as exc:
+                    await self._send_json(writer, exc.status, {"error": str(exc)}, close=True)
+                    return
+                if headers.get("upgrade", "").lower() == "websocket":
+                    await self._handle_websocket(reader, writer, target, headers)
+                    return
+                keep_alive = headers.get("connection", "").lower() != "close"
+                try:
+                    body = await self._read_body(reader, headers)
+                    status, payload = await self._route(method, target, body)
+                except _HttpError as exc:
+                    status, payload = exc.status, {"error": str(exc)}
+                except Exception:
+                    log.exception("%s %s failed", method, target)
+                    status, payload = 500, {"error": "internal error"}
+                await self._send_json(writer, status, payload, close=not keep_alive)
+                if not keep_alive:
+                    return
+        except ConnectionError:
+            pass
+        finally:
+            self._connections.pop(writer, None)
+            writer.close()
+
+    async def _read_body(self, reader, headers):
+        raw_length = headers.get("content-length", "0") or "0"
+        if not (raw_length.isascii() and raw_length.isdigit()):
+            raise _HttpError(400, "bad Content-Length")
+        length = int(raw_length)
+        if length > self.max_body:
+            raise _HttpError(413)
+        if not length:
+            return None
+        try:
+            raw = await asyncio.wait_for(reader.readexactly(length), self.read_timeout)
+        except asyncio.TimeoutError:
+            raise _HttpError(408)
+        try:
+            return json.loads(raw)
+        except ValueError:
+            raise _HttpError(400, "body must be JSON")
+
+    async def _route(self, method, target, body):
+        path = urlsplit(target).path.rstrip("/")
+        parts = path.strip("/").split("/")
+
+        if path == "/healthz":
+            return 200, {
+                "status": "ok",
+                "sessions": len(self.service.sessions),
+                "sentiment_cache": sentiment_cache_info(),
+            }
+
+        if path == "/metrics":
+            if not metrics.ENABLED:
+                raise _HttpError(404, "metrics are disabled")
+            return 200, _PlainText(metrics.render(), metrics.CONTENT_TYPE)
+
+        if path == "/analytics/mood":
+            if method != "GET":
+                raise _HttpError(405)
+            return 200, self.service.mood_summary()
+
+        if parts[0] != "sessions":
+            raise _HttpError(404)
+        if len(parts) == 1:
+            if method != "POST":
+                raise _HttpError(405)
+            return 201, {"session": self._create_session(), "reply": opening_message()}
+
+        session_id = parts[1]
+        if not await self.service.open_session(session_id):
+            raise _HttpError(404, "unknown session")
+        if len(parts) == 2:
+            if method == "GET":
+                return 200, {"session": session_id,
+                             "history": self.service.get_history(session_id)}
+            if method == "DELETE":
+                self.service.drop_session(session_id)
+                return 204, None
+            raise _HttpError(405)
+        if len(parts) == 3 and parts[2] == "mood":
+            if method != "GET":
+                raise _HttpError(405)
+            return 200, {"session": session_id, "mood": self.service.get_mood(session_id)}
+        if len(parts) == 3 and parts[2] == "messages":
+            if method != "POST":
+                raise _HttpError(405)
+            text = _message_text(body)
+            return 200, _reply_payload(session_id, await self._reply(session_id, text))
+        raise _HttpError(404)
+
+    def _create_session(self):
+        try:
+            return self.service.create_session()
+        except Overloaded as exc:
+            raise _HttpError(503, str(exc))
+
+    async def _reply(self, session_id, text):
+        try:
+            return await self.service.reply(session_id, text)
+        except UnknownSession:
+            raise _HttpError(404, "unknown session")
+        except Overloaded as exc:
+            raise _HttpError(503, str(exc))
+        except asyncio.TimeoutError:
+            raise _HttpError(504, "reply timed out")
+
+    async def _send_json(self, writer, status, payload, close=False):
+        if isinstance(payload, _PlainText):
+            body, content_type = payload.text.encode("utf-8"), payload.content_type
+        else:
+            body = b"" if payload is None else json.dumps(payload).encode("utf-8")
+            content_type = "application/json; charset=utf-8"
+        head = [
+            f"HTTP/1.1 {status} {_REASONS.get(status, '')}",
+            f"Content-Length: {len(body)}",
+            "Connection: close" if close else "Connection: keep-alive",
+        ]
+        if body:
+            head.append(f"Content-Type: {content_type}")
+        writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1") + body)
+        await writer.drain()
+
+    # ----- websocket -----
+
+    async def _handle_websocket(self, reader, writer, target, headers):
+        key = headers.get("sec-websocket-key")
+        if not key:
+            await self._send_json(writer, 400, {"error": "missing Sec-WebSocket-Key"}, close=True)
+            return
+        query = parse_qs(urlsplit(target).query)
+        session_id = (query.get("session") or [None])[0]
+        if urlsplit(target).path.rstrip("/") != "/ws":
+            await self._send_json(writer, 404, {"error": "not found"}, close=True)
+            return
+        if session_id and not await self.service.open_session(session_id):
+            await self._send_json(writer, 404, {"error": "unknown session"}, close=True)
+            return
+        if not session_id:
+            try:
+                session_id = self.service.create_session()
+            except Overloaded as exc:
+                await self._send_json(writer, 503, {"error": str(exc)}, close=True)
+                return
+
+        accept = base64.b64encode(hashlib.sha1(key.encode("latin-1") + _WS_GUID).digest())
+        writer.write(
+            b"HTTP/1.1 101 Switching Protocols\r\n"
+            b"Upgrade: websocket\r\nConnection: Upgrade\r\n"
+            b"Sec-WebSocket-Accept: " + accept + b"\r\n\r\n"
+        )
+        ws = WebSocket(reader, writer, max_message=self.max_body, client=False)
+        await ws.send_json({"session": session_id, "reply": opening_message()})
+
+        # messages on one socket are handled in order; a slow reply holds
+        # back reading the next frame, which is the per-connection backpressure
+        try:
+            while True:
+                try:
+                    message = await asyncio.wait_for(ws.receive(), self.idle_timeout)
+                except (asyncio.TimeoutError, asyncio.IncompleteReadError,
+                        ConnectionError, UnicodeDecodeError):
+                    break
+                if message is None:
+                    break
+                try:
+                    text = _message_text(json.loads(message))
+                except ValueError:
+                    await ws.send_json({"error": "frames must be JSON objects with a 'text' field"})
+                    continue
+                except _HttpError as exc:
+                    await ws.send_json({"error": str(exc), "status": exc.status})
+                    continue
+                try:
+                    bot_reply = await self._reply(session_id, text)
+                except _HttpError as exc:
+                    await ws.send_json({"error": str(exc), "status": exc.status})
+                    continue
+                except Exception:
+                    log.exception("websocket message in session %s failed", session_id)
+                    await ws.send_json({"error": "internal error", "status": 500})
+                    continue
+                if self.pacing.enabled and bot_reply.intent != "risk":
+                    async for chunk in astream_reply(bot_reply.text, self.pacing):
+                        await ws.send_json({"delta": chunk})
+                await ws.send_json(_reply_payload(session_id, bot_reply))
+        finally:
+            await ws.close()
+
+
+def _parse_head(head: bytes):
+    lines = head.decode("latin-1").split("\r\n")
+    try:
+        method, target, _version = lines[0].split(" ", 2)
+    except ValueError:
+        raise _HttpError(400)
+    headers = {}
+    for line in lines[1:]:
+        if ":" in line:
+            name, value = line.split(":", 1)
+            headers[name.strip().lower()] = value.strip()
+    return method.upper(), target, headers
+
+
+def _reply_payload(session_id, reply):
+    return {"session": session_id, "reply": reply.text,
+            "intent": reply.intent, "pack": reply.pack_version}
+
+
+def _message_text(body) -> str:
+    text = body.get("text") if isinstance(body, dict) else None
+    if not isinstance(text, str) or not text.strip():
+        raise _HttpError(400, "expected {\"text\": \"...\"}")
+    return text
+
+
+class WebSocket:
+    """Minimal RFC 6455 text-frame endpoint, used by the server and the test client."""
+
+    def __init__(self, reader, writer, max_message=64 * 1024, client=False):
+        self.reader = reader
+        self.writer = writer
+        self.max_message = max_message
+        self.client = client  # clients must mask their frames
+        self.closed = False
+
+    async def _send_frame(self, opcode, payload: bytes):
+        header = bytearray([0x80 | opcode])
+        mask_bit = 0x80 if self.client else 0
+        n = len(payload)
+        if n < 126:
+            header.append(mask_bit | n)
+        elif n < 1 << 16:
+            header.append(mask_bit | 126)
+            header += struct.pack("!H", n)
+        else:
+            header.append(mask_bit | 127)
+            header += struct.pack("!Q", n)
+        if self.client:
+            mask = os.urandom(4)
+            header += mask
+            payload = _apply_mask(payload, mask)
+        self.writer.write(bytes(header) + payload)
+        await self.writer.drain()
+
+    async def send(self, text: str):
+        await self._send_frame(0x1, text.encode("utf-8"))
+
+    async def send_json(self, obj):
+        await self.send(json.dumps(obj))
+
+    async def send_bytes(self, data: bytes):
+        await self._send_frame(0x2, data)
+
+    async def receive(self):
+        """Next text message, or None once the peer closes."""
+        message = await self.receive_bytes()
+        return None if message is None else message.decode("utf-8")
+
+    async def receive_bytes(self):
+        """Next message's raw payload (text or binary), or None once the peer closes."""
+        parts = []
+        size = 0
+        while True:
+            b0, b1 = await self.reader.readexactly(2)
+            fin, opcode = b0 & 0x80, b0 & 0x0F
+            n = b1 & 0x7F
+            if n == 126:
+                (n,) = struct.unpack("!H", await self.reader.readexactly(2))
+            elif n == 127:
+                (n,) = struct.unpack("!Q", await self.reader.readexactly(8))
+            if n > self.max_message or size + n > self.max_message:
+                await self.close(1009)
+                return None
+            mask = await self.reader.readexactly(4) if b1 & 0x80 else None
+            payload = await self.reader.readexactly(n)
+            if mask:
+                payload = _apply_mask(payload, mask)
+
+            if opcode == 0x8:  # close
+                await self.close()
+                return None
+            if opcode == 0x9:  # ping
+                await self._send_frame(0xA, payload)
+                continue
+            if opcode == 0xA:  # pong
+                continue
+            parts.append(payload)
+            size += n
+            if fin:
+                return b"".join(parts)
+
+    async def receive_json(self):
+        message = await self.receive()
+        return None if message is None else json.loads(message)
+
+    async def close(self, code=1000):
+        if self.closed:
+            return
+        self.closed = True
+        try:
+            await self._send_frame(0x8, struct.pack("!H", code))
+        except ConnectionError:
+            pass
+        self.writer.close()
+
+
+def _apply_mask(payload: bytes, mask: bytes) -> bytes:
+    n = len(payload)
+    key = int.from_bytes((mask * (n // 4 + 1))[:n], "big")
+    return (int.from_bytes(payload, "big") ^ key).to_bytes(n, "big")
+
+
+# ========= IN-PROCESS TEST CLIENT =========
+
+class TestClient:
+    """
+    Runs a ChatServer on an ephemeral local port inside the current event
+    loop and talks to it over real sockets:
+
+        async with TestClient() as client:
+            status, body = await client.request("POST", "/sessions")
+            ws = await client.websocket("/ws")
+    """
+
+    __test__ = False  # not a pytest test class
+
+    def __init__(self, server=None, **server_kwargs):
+        self.server = server or ChatServer(port=0, **server_kwargs)
+
+    async def __aenter__(self):
+        await self.server.start()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.server.close()
+
+    async def request(self, method, path, body=None):
+        reader, writer = await asyncio.open_connection("127.0.0.1", self.server.port)
+        try:
+            data = b"" if body is None else json.dumps(body).encode("utf-8")
+            writer.write(
+                f"{method} {path} HTTP/1.1\r\nHost: localhost\r\n"
+                f"Content-Length: {len(data)}\r\nConnection: close\r\n\r\n".encode("latin-1")
+                + data
+            )
+            await writer.drain()
+            _status_line, headers, status = await _read_response_head(reader)
+            length = int(headers.get("content-length", 0))
+            raw = await reader.readexactly(length) if length else b""
+            if not raw:
+                return status, None
+            if headers.get("content-type", "").startswith("application/json"):
+                return status, json.loads(raw)
+            return status, raw.decode("utf-8")
+        finally:
+            writer.close()
+
+    async def websocket(self, path="/ws"):
+        return await connect_websocket("127.0.0.1", self.server.port, path)
+
+
+async def connect_websocket(host, port, path="/ws", subprotocol=None, max_message=64 * 1024):
+    """Client side of the WebSocket handshake; returns a WebSocket."""
+    reader, writer = await asyncio.open_connection(host, port)
+    key = base64.b64encode(os.urandom(16)).decode("ascii")
+    extra = f"Sec-WebSocket-Protocol: {subprotocol}\r\n" if subprotocol else ""
+    writer.write(
+        f"GET {path} HTTP/1.1\r\nHost: {host}:{port}\r\nUpgrade: websocket\r\n"
+        f"Connection: Upgrade\r\nSec-WebSocket-Key: {key}\r\n"
+        f"Sec-WebSocket-Version: 13\r\n{extra}\r\n".encode("latin-1")
+    )
+    await writer.drain()
+    _status_line, _headers, status = await _read_response_head(reader)
+    if status != 101:
+        writer.close()
+        raise ConnectionError(f"websocket upgrade failed with HTTP {status}")
+    return WebSocket(reader, writer, max_message=max_message, client=True)
+
+
+async def _read_response_head(reader):
+    head = (await reader.readuntil(b"\r\n\r\n")).decode("latin-1").split("\r\n")
+    headers = {}
+    for line in head[1:]:
+        if ":" in line:
+            name, value = line.split(":", 1)
+            headers[name.strip().lower()] = value.strip()
+    return head[0], headers, int(head[0].split(" ")[1])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="MindMate HTTP/WebSocket chat API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--max-inflight", type=int, default=32)
+    parser.add_argument("--max-queued", type=int, default=1024)
+    parser.add_argument("--reply-timeout", type=float, default=5.0)
+    parser.add_argument("--sentiment-batch", type=int, default=64,
+                        help="max messages scored together (0 disables batching)")
+    parser.add_argument("--reload-interval", type=float, default=1.0,
+                        help="seconds between checks of the intent pack file (0 disables)")
+    parser.add_argument("--session-db", default=os.environ.get("MINDMATE_SESSION_DB"),
+                        help="SQLite file to keep sessions in, shared by workers "
+                             "(default: MINDMATE_SESSION_DB; unset keeps them in memory)")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    warm_up()
+    if args.reload_interval > 0:
+        enable_hot_reload(interval=args.reload_interval)
+    service = ChatService(
+        max_inflight=args.max_inflight,
+        max_queued=args.max_queued,
+        reply_timeout=args.reply_timeout,
+        sentiment_batch=args.sentiment_batch,
+        store=SQLiteStore(args.session_db) if args.session_db else None,
+        crisis=pipeline_from_env(),
+    )
+    server = ChatServer(service, host=args.host, port=args.port)
+    print(f"MindMate API on http://{args.host}:{args.port}")
+    try:
+        asyncio.run(server.serve_forever())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if service.store is not None:
+            service.store.close()  # commits queued turns
+        if service.crisis is not None:
+            service.crisis.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+Rolling mood of one conversation, updated in O(1) per user message.
+
+Every message's VADER compound score and matched mood words are folded
+into a few numbers, so nothing ever rescans the history:
+
+- `ewma`: exponentially weighted compound score (recent messages count most)
+- `anxious`, `lonely`, `overwhelmed`: how many messages matched each mood
+- `negative_streak`: consecutive negative messages up to now, and the
+  longest such streak seen
+
+The reply engine reads it to notice sustained low mood; the API reports
+it per session and aggregated.
+"""
+MOODS = ("anxious", "lonely", "overwhelmed")
+
+NEGATIVE = -0.2  # a message at or below this compound counts as negative
+ALPHA = 0.3  # weight of the newest message in `ewma`
+
+# sustained low mood: this many negative messages in a row with the
+# average this low; offered again every ESCALATE_STREAK messages
+ESCALATE_STREAK = 5
+ESCALATE_EWMA = -0.4
+
+
+class MoodState:
+    __slots__ = (
+        "messages", "ewma", "last_compound",
+        "anxious", "lonely", "overwhelmed",
+        "negative_streak", "longest_negative_streak",
+    )
+
+    def __init__(self):
+        self.messages = 0
+        self.ewma = 0.0
+        self.last_compound = 0.0
+        self.anxious = self.lonely = self.overwhelmed = 0
+        self.negative_streak = 0
+        self.longest_negative_streak = 0
+
+    def update(self, compound: float, hits=()) -> None:
+        """Fold in one user message (its compound score and matched phrase groups)."""
+        if self.messages:
+            self.ewma += ALPHA * (compound - self.ewma)
+        else:
+            self.ewma = compound
+        self.messages += 1
+        self.last_compound = compound
+        if "anxious" in hits:
+            self.anxious += 1
+        if "lonely" in hits:
+            self.lonely += 1
+        if "overwhelmed" in hits:
+            self.overwhelmed += 1
+        if compound <= NEGATIVE:
+            self.negative_streak += 1
+            if self.negative_streak > self.longest_negative_streak:
+                self.longest_negative_streak = self.negative_streak
+        else:
+            self.negative_streak = 0
+
+    def is_low(self) -> bool:
+        """In a sustained low stretch: ESCALATE_STREAK+ negative messages in a row, average this low."""
+        return self.negative_streak >= ESCALATE_STREAK and self.ewma <= ESCALATE_EWMA
+
+    def sustained_low(self) -> bool:
+        """True on the message that completes a long enough low stretch (and every ESCALATE_STREAK after)."""
+        return self.is_low() and self.negative_streak % ESCALATE_STREAK == 0
+
+    def to_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+def summarize(states):
+    """Aggregate view over many sessions' MoodStates (for analytics)."""
+    n = active = low = 0
+    ewma_sum = 0.0
+    moods = dict.fromkeys(MOODS, 0)
+    for state in states:
+        n += 1
+        if not state.messages:
+            continue
+        active += 1
+        ewma_sum += state.ewma
+        if state.is_low():
+            low += 1
+        for mood in MOODS:
+            moods[mood] += getattr(state, mood)
+    return {
+        "sessions": n,
+        "active_sessions": active,
+        "mean_ewma": ewma_sum / active if active else 0.0,
+        "sessions_sustained_low": low,
+        "mood_hits": moods,
+    }
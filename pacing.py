@@ -0,0 +1,82 @@
+"""
+Reply delivery pacing.
+
+Instead of sleeping before showing a reply, the reply is streamed out a
+few words at a time so it "types" in. The whole delay is spread across
+visible chunks, capped by `max_total`, and can be switched off entirely
+(`NO_PACING`, or MINDMATE_PACING=off) for latency-sensitive deployments.
+"""
+import asyncio
+import os
+import re
+import time
+from dataclasses import dataclass
+
+_CHUNK_RE = re.compile(r"\S+\s*|\s+")
+
+
+@dataclass(frozen=True)
+class PacingPolicy:
+    enabled: bool = True
+    words_per_chunk: int = 3
+    chunk_delay: float = 0.04  # seconds between chunks
+    max_total: float = 1.0  # upper bound on the added delay for one reply
+
+    def delay_for(self, n_chunks: int) -> float:
+        """Delay to use between chunks so the total stays under `max_total`."""
+        if not self.enabled or n_chunks <= 1:
+            return 0.0
+        return min(self.chunk_delay, self.max_total / (n_chunks - 1))
+
+
+NO_PACING = PacingPolicy(enabled=False)
+
+
+def policy_from_env(environ=os.environ) -> PacingPolicy:
+    """
+    MINDMATE_PACING=off disables pacing; MINDMATE_PACING_DELAY and
+    MINDMATE_PACING_MAX override the per-chunk and total delay (seconds).
+    """
+    if environ.get("MINDMATE_PACING", "").lower() in ("off", "0", "false", "none"):
+        return NO_PACING
+    default = PacingPolicy()
+    return PacingPolicy(
+        chunk_delay=float(environ.get("MINDMATE_PACING_DELAY", default.chunk_delay)),
+        max_total=float(environ.get("MINDMATE_PACING_MAX", default.max_total)),
+    )
+
+
+def split_chunks(reply: str, words_per_chunk: int):
+    """Split into chunks of a few words, keeping the original whitespace."""
+    words = _CHUNK_RE.findall(reply)
+    step = max(1, words_per_chunk)
+    return ["".join(words[i:i + step]) for i in range(0, len(words), step)]
+
+
+def stream_reply(reply: str, policy: PacingPolicy, sleep=time.sleep):
+    """
+    Generator for `st.write_stream`. With pacing off the whole reply is
+    yielded at once and nothing sleeps.
+    """
+    if not policy.enabled:
+        yield reply
+        return
+    chunks = split_chunks(reply, policy.words_per_chunk)
+    delay = policy.delay_for(len(chunks))
+    for i, chunk in enumerate(chunks):
+        if i and delay:
+            sleep(delay)
+        yield chunk
+
+
+async def astream_reply(reply: str, policy: PacingPolicy):
+    """Same as `stream_reply`, but waits with asyncio.sleep (never blocks the loop)."""
+    if not policy.enabled:
+        yield reply
+        return
+    chunks = split_chunks(reply, policy.words_per_chunk)
+    delay = policy.delay_for(len(chunks))
+    for i, chunk in enumerate(chunks):
+        if i and delay:
+            await asyncio.sleep(delay)
+        yield chunk
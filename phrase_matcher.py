@@ -0,0 +1,91 @@
+from collections import deque
+
+
+class PhraseMatcher:
+    """
+    Aho-Corasick automaton over several named phrase lists.
+
+    Built once, then `match(text)` walks the text a single time and
+    returns the names of every list that has at least one phrase
+    occurring in it (same result as `any(p in text for p in phrases)`
+    for each list).
+    """
+
+    def __init__(self, groups):
+        self.names = tuple(groups)
+        self._phrases = {name: tuple(p for p in phrases if p) for name, phrases in groups.items()}
+        self._bits = {name: 1 << i for i, name in enumerate(self.names)}
+
+        # trie: one dict of char -> state per node, plus an output bitmask
+        goto = [{}]
+        out = [0]
+        for name, phrases in groups.items():
+            bit = self._bits[name]
+            for phrase in phrases:
+                if not phrase:
+                    continue
+                state = 0
+                for ch in phrase:
+                    nxt = goto[state].get(ch)
+                    if nxt is None:
+                        nxt = len(goto)
+                        goto[state][ch] = nxt
+                        goto.append({})
+                        out.append(0)
+                    state = nxt
+                out[state] |= bit
+
+        # failure links (BFS), turning the trie into a full DFA so the
+        # scan loop is a single dict lookup per character
+        delta = [dict(t) for t in goto]
+        fail = [0] * len(goto)
+        queue = deque()
+        for nxt in goto[0].values():
+            queue.append(nxt)
+        while queue:
+            state = queue.popleft()
+            out[state] |= out[fail[state]]
+            # inherit the fallback transitions, then override with our own
+            inherited = dict(delta[fail[state]])
+            for ch, nxt in goto[state].items():
+                fail[nxt] = delta[fail[state]].get(ch, 0) if state else 0
+                queue.append(nxt)
+            inherited.update(goto[state])
+            delta[state] = inherited
+
+        # drop transitions back to the root, `.get(ch, 0)` covers them
+        self._delta = [
+            {ch: nxt for ch, nxt in t.items() if nxt} for t in delta
+        ]
+        self._out = out
+        self._sets = {}
+
+    def scan(self, text: str) -> int:
+        """Bitmask of matched groups for `text` (already normalized)."""
+        delta = self._delta
+        out = self._out
+        state = 0
+        mask = 0
+        for ch in text:
+            state = delta[state].get(ch, 0)
+            mask |= out[state]
+        return mask
+
+    def match(self, text: str) -> frozenset:
+        """Names of all phrase groups that occur somewhere in `text`."""
+        mask = self.scan(text)
+        found = self._sets.get(mask)
+        if found is None:
+            found = frozenset(
+                name for name, bit in self._bits.items() if mask & bit
+            )
+            self._sets[mask] = found
+        return found
+
+    def phrases_in(self, text: str, name: str) -> list:
+        """
+        The phrases of group `name` that occur in `text`. Slow path (one
+        substring test per phrase), for when the matched words themselves
+        are needed, e.g. to log a crisis hit.
+        """
+        return [p for p in self._phrases[name] if p in text]
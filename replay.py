@@ -0,0 +1,255 @@
+"""
+Replay JSONL conversation archives through the reply engine.
+
+    python replay.py conversations.jsonl[.gz] -o replies.jsonl --seed 7 --workers 8
+
+Each input line is one conversation: a JSON object with a "messages" list
+(user texts, or {"role", "text"} objects whose user turns are replayed) and
+an optional "id". Lines with just a "text" or "body" field replay as a
+single-turn conversation. Every user turn produces one output line:
+
+    {"conversation": id, "turn": n, "user": ..., "reply": ..., "intent": ...,
+     "sent_label": ..., "compound": ..., "crisis": ..., "pack": ...}
+
+Input is read lazily and handed to a process pool in chunks, with only a
+few chunks in flight at once, so memory stays flat however big the
+archive is. Output keeps input order. With --seed, each conversation's
+random template picks are seeded from (seed, line number), so results are
+the same for any worker count or chunk size. Each chunk's user texts are
+sentiment-scored in one batch (batch_sentiment) before the replies run.
+"""
+import argparse
+import gzip
+import json
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+from batch_sentiment import BatchSentimentScorer
+from conversation import Conversation
+from mindmate_engine import opening_message, respond, warm_up
+
+
+def _open_input(path):
+    if path == "-":
+        return sys.stdin
+    if path.endswith(".gz"):
+        return gzip.open(path, "rt", encoding="utf-8")
+    return open(path, encoding="utf-8")
+
+
+def _user_messages(record) -> list:
+    """The user texts of one conversation; ValueError if the record is malformed."""
+    if "messages" in record:
+        messages = record["messages"]
+        if not isinstance(messages, list):
+            raise ValueError("'messages' is not a list")
+        texts = []
+        for m in messages:
+            if isinstance(m, dict):
+                if m.get("role", "user") != "user":
+                    continue
+                m = m.get("text") or m.get("content") or ""
+            if not isinstance(m, str):
+                raise ValueError("a user message is not a string")
+            texts.append(m)
+        return texts
+    for field in ("text", "body"):
+        if isinstance(record.get(field), str):
+            return [record[field]]
+    raise ValueError("no 'messages', 'text' or 'body' field")
+
+
+def replay_conversation(record, line_no, seed=None, compounds=None):
+    """
+    Output records for every user turn of one conversation. `compounds`
+    optionally iterates precomputed compound scores, one per non-blank
+    user text.
+    """
+    conv_id = record.get("id", record.get("request_id", line_no))
+    history = Conversation(
+        [("assistant", opening_message())], archive=None,
+        seed=None if seed is None else f"{seed}:{line_no}",
+    )
+    out = []
+    for turn, text in enumerate(_user_messages(record)):
+        if not text.strip():
+            continue
+        history.append("user", text)
+        reply = respond(text, history, next(compounds) if compounds else None)
+        history.append("assistant", reply.text)
+        out.append({
+            "conversation": conv_id,
+            "turn": turn,
+            "user": text,
+            "reply": reply.text,
+            "intent": reply.intent,
+            "sent_label": reply.sent_label,
+            "compound": reply.compound,
+            "crisis": reply.intent == "risk",
+            "pack": reply.pack_version,
+        })
+    return out
+
+
+_scorer = None
+
+
+def _batch_scorer():
+    global _scorer
+    if _scorer is None:
+        _scorer = BatchSentimentScorer()
+    return _scorer
+
+
+def replay_chunk(chunk, seed=None):
+    """Worker entry point: raw (line_no, line) pairs -> (output lines, turns, errors)."""
+    lines = []
+    turns = errors = 0
+    parsed = []
+    texts = []
+    # validate every record before scoring, so the batch holds exactly the
+    # texts of the records that will be replayed
+    for line_no, line in chunk:
+        try:
+            record = json.loads(line)
+            if not isinstance(record, dict):
+                raise ValueError("line is not a JSON object")
+            user_texts = [t for t in _user_messages(record) if t.strip()]
+        except ValueError as exc:
+            parsed.append((line_no, exc, 0))
+            continue
+        texts.extend(user_texts)
+        parsed.append((line_no, record, len(user_texts)))
+
+    # score every user text of the chunk at once
+    compounds = iter(_batch_scorer().compound_many(texts))
+    for line_no, record, n in parsed:
+        if isinstance(record, Exception):
+            errors += 1
+            lines.append(json.dumps({"line": line_no, "error": str(record)}))
+            continue
+        # each record gets its own scores, so one failing can't shift the rest
+        own = iter(list(islice(compounds, n)))
+        try:
+            results = replay_conversation(record, line_no, seed, own)
+        except Exception as exc:
+            errors += 1
+            lines.append(json.dumps({"line": line_no, "error": f"{type(exc).__name__}: {exc}"}))
+            continue
+        turns += len(results)
+        lines.extend(json.dumps(r, ensure_ascii=False) for r in results)
+    return lines, turns, errors
+
+
+def _chunks(paths, chunk_size):
+    chunk = []
+    line_no = 0
+    for path in paths:
+        f = _open_input(path)
+        try:
+            for line in f:
+                line_no += 1
+                if not line.strip():
+                    continue
+                chunk.append((line_no, line))
+                if len(chunk) >= chunk_size:
+                    yield chunk
+                    chunk = []
+        finally:
+            if f is not sys.stdin:
+                f.close()
+    if chunk:
+        yield chunk
+
+
+def replay(paths, out, workers=None, chunk_size=256, seed=None, in_flight=None, progress=None):
+    """
+    Replay `paths` into the text stream `out`. Returns a stats dict.
+    workers=0 runs everything in this process.
+    """
+    stats = {"conversations": 0, "turns": 0, "errors": 0}
+    started = time.perf_counter()
+
+    def _write(result, n_conversations):
+        lines, turns, errors = result
+        if lines:
+            out.write("\n".join(lines))
+            out.write("\n")
+        stats["conversations"] += n_conversations
+        stats["turns"] += turns
+        stats["errors"] += errors
+        if progress:
+            progress(stats, time.perf_counter() - started)
+
+    if workers == 0:
+        warm_up()
+        for chunk in _chunks(paths, chunk_size):
+            _write(replay_chunk(chunk, seed), len(chunk))
+    else:
+        workers = workers or os.cpu_count() or 1
+        with ProcessPoolExecutor(max_workers=workers, initializer=warm_up) as pool:
+            limit = in_flight or 2 * workers
+            pending = deque()
+            for chunk in _chunks(paths, chunk_size):
+                pending.append((pool.submit(replay_chunk, chunk, seed), len(chunk)))
+                # bounded read-ahead: wait for the oldest chunk before reading more
+                if len(pending) >= limit:
+                    future, n = pending.popleft()
+                    _write(future.result(), n)
+            while pending:
+                future, n = pending.popleft()
+                _write(future.result(), n)
+
+    elapsed = time.perf_counter() - started
+    stats["seconds"] = elapsed
+    stats["turns_per_second"] = stats["turns"] / elapsed if elapsed else 0.0
+    return stats
+
+
+def _print_progress(stats, elapsed):
+    rate = stats["turns"] / elapsed if elapsed else 0.0
+    print(f"\r{stats['conversations']} conversations, {stats['turns']} turns, "
+          f"{rate:,.0f} turns/s", end="", file=sys.stderr, flush=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay JSONL conversations through MindMate")
+    parser.add_argument("inputs", nargs="+", help="JSONL files (.gz ok), '-' for stdin")
+    parser.add_argument("-o", "--output", default="-", help="output JSONL (default stdout)")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="worker processes (default: CPU count, 0 = in-process)")
+    parser.add_argument("--chunk-size", type=int, default=256,
+                        help="conversations per task sent to a worker")
+    parser.add_argument("--seed", default=None, help="make template choices reproducible")
+    parser.add_argument("--quiet", action="store_true", help="no progress on stderr")
+    args = parser.parse_args(argv)
+
+    out = sys.stdout if args.output == "-" else open(args.output, "w", encoding="utf-8")
+    try:
+        stats = replay(
+            args.inputs, out,
+            workers=args.workers,
+            chunk_size=args.chunk_size,
+            seed=args.seed,
+            progress=None if args.quiet else _print_progress,
+        )
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    if not args.quiet:
+        print(file=sys.stderr)  # end the progress line
+    print(
+        f"{stats['conversations']} conversations, {stats['turns']} turns, "
+        f"{stats['errors']} errors in {stats['seconds']:.2f}s "
+        f"({stats['turns_per_second']:,.0f} turns/s)",
+        file=sys.stderr,
+    )
+    return 1 if stats["errors"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,444 @@
+"""
+Durable chat sessions, shared by the Streamlit page and the API.
+
+A store keeps each session's turns as (role, text) pairs:
+
+    store = open_store()                     # MINDMATE_SESSION_DB, else in memory
+    store.create(session_id, [("assistant", opening)])
+    store.append(session_id, "user", text)   # never waits on disk
+    store.append(session_id, "assistant", reply.text, pack=reply.pack_version)
+    turns = store.load(session_id)           # last `window` turns, or None
+
+SQLiteStore also records the intent pack version an assistant turn was
+picked from (the `pack` column of `turns`), for auditing what the bot said
+under which pack; load() still returns plain (role, text) pairs.
+
+MemoryStore lives and dies with the process (idle sessions are dropped
+after a day). SQLiteStore keeps sessions in one SQLite file in WAL mode,
+so several Streamlit or API worker processes can share it and a restart
+loses nothing:
+
+- appends go on a queue and a writer thread commits them in batches (one
+  transaction per batch, at most `flush_interval` after the append)
+- recently used sessions are cached; a cached session is reused as long as
+  its version in the database hasn't moved (a primary-key lookup), so a
+  session picked up by another process is re-read, not served stale
+- sessions idle for longer than `ttl` are deleted, and turns older than the
+  last `window` of a session are compacted away, by the writer thread
+
+One process should write to a session at a time (the API and page both
+serve a session from one place); concurrent writers to the same session
+would interleave their turns.
+"""
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+log = logging.getLogger(__name__)
+
+ROLES = ("user", "assistant")
+_ROLE_CODES = {role: i for i, role in enumerate(ROLES)}
+
+
+def _check_role(role):
+    if role not in _ROLE_CODES:
+        raise ValueError(f"unknown role {role!r}")
+    return _ROLE_CODES[role]
+
+
+def open_store(path=None, **kwargs):
+    """SQLiteStore at `path` (default: MINDMATE_SESSION_DB), or a MemoryStore if unset."""
+    path = path or os.environ.get("MINDMATE_SESSION_DB")
+    if path:
+        return SQLiteStore(path, **kwargs)
+    return MemoryStore(**kwargs)
+
+
+# ========= IN MEMORY =========
+
+class MemoryStore:
+    """
+    Sessions in a dict; same interface as SQLiteStore, nothing survives the
+    process. A sweeper thread drops sessions idle for longer than `ttl`.
+    """
+
+    def __init__(self, window=200, ttl=24 * 3600.0, sweep_interval=300.0):
+        self.window = window
+        self.ttl = ttl
+        self.sweep_interval = sweep_interval
+        self._sessions = {}  # id -> [turns, last_seen]
+        self._lock = threading.Lock()
+        self._closed = threading.Event()
+        self._sweeper = threading.Thread(
+            target=self._sweep_loop, name="mindmate-session-sweeper", daemon=True
+        )
+        self._sweeper.start()
+
+    def create(self, session_id, turns=()):
+        with self._lock:
+            self._sessions[session_id] = [list(turns)[-self.window:], time.time()]
+
+    def append(self, session_id, role, text, pack=None):
+        _check_role(role)  # `pack` isn't kept: nothing here outlives the process
+        with self._lock:
+            entry = self._sessions.setdefault(session_id, [[], 0.0])
+            entry[0].append((role, text))
+            if len(entry[0]) > 2 * self.window:
+                del entry[0][:-self.window]
+            entry[1] = time.time()
+
+    def load(self, session_id):
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            return None if entry is None else entry[0][-self.window:]
+
+    def exists(self, session_id) -> bool:
+        return session_id in self._sessions
+
+    def delete(self, session_id) -> bool:
+        with self._lock:
+            return self._sessions.pop(session_id, None) is not None
+
+    def evict_idle(self, ttl=None) -> int:
+        cutoff = time.time() - (self.ttl if ttl is None else ttl)
+        with self._lock:
+            stale = [sid for sid, (_, seen) in self._sessions.items() if seen < cutoff]
+            for sid in stale:
+                del self._sessions[sid]
+        return len(stale)
+
+    def compact(self):
+        with self._lock:
+            for turns, _ in self._sessions.values():
+                del turns[:-self.window]
+
+    def flush(self, timeout=None):
+        return True
+
+    def close(self):
+        self._closed.set()
+        self._sweeper.join()
+
+    def _sweep_loop(self):
+        while not self._closed.wait(self.sweep_interval):
+            removed = self.evict_idle()
+            if removed:
+                log.info("session store: evicted %d idle sessions", removed)
+
+
+# ========= SQLITE (WAL) =========
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    id TEXT PRIMARY KEY,
+    created REAL NOT NULL,
+    last_seen REAL NOT NULL,
+    version INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS turns (
+    id INTEGER PRIMARY KEY,
+    session TEXT NOT NULL,
+    role INTEGER NOT NULL,
+    text TEXT NOT NULL,
+    pack TEXT
+);
+CREATE INDEX IF NOT EXISTS turns_by_session ON turns (session, id);
+CREATE INDEX IF NOT EXISTS sessions_by_last_seen ON sessions (last_seen);
+"""
+
+_FLUSH = object()  # queue marker: signal the event once everything before it is written
+_STOP = object()
+
+
+class SQLiteStore:
+    def __init__(self, path, window=200, ttl=7 * 24 * 3600.0, cache_size=1024,
+                 flush_interval=0.05, batch_size=512, sweep_interval=300.0):
+        self.path = path
+        self.window = window
+        self.ttl = ttl
+        self.cache_size = cache_size
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.sweep_interval = sweep_interval
+        self.writes = 0  # turns committed by this process
+        self.batches = 0
+        self.errors = 0
+
+        self._local = threading.local()
+        setup = self._connect()
+        setup.executescript(_SCHEMA)
+        columns = {row[1] for row in setup.execute("PRAGMA table_info(turns)")}
+        if "pack" not in columns:  # file from before pack versions were recorded
+            setup.execute("ALTER TABLE turns ADD COLUMN pack TEXT")
+        setup.commit()
+
+        self._queue = queue.SimpleQueue()
+        self._lock = threading.Lock()
+        self._cache = OrderedDict()  # id -> [turns, version]
+        self._pending = {}  # id -> turns queued but not yet committed
+        self._touched = set()  # sessions appended to since the last compaction
+        self._closed = False
+        self._writer = threading.Thread(
+            target=self._write_loop, name="mindmate-session-writer", daemon=True
+        )
+        self._writer.start()
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30.0)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=30000")
+            self._local.conn = conn
+        return conn
+
+    # ----- writes (queued) -----
+
+    def create(self, session_id, turns=()):
+        turns = [(role, text) for role, text in turns]
+        for role, _ in turns:
+            _check_role(role)
+        with self._lock:
+            self._cache_put(session_id, turns[-self.window:], 0)
+            # the session row counts as a pending write too, so it reads from cache until committed
+            self._pending[session_id] = self._pending.get(session_id, 0) + len(turns) + 1
+        self._queue.put(("create", session_id, time.time(), turns))
+
+    def append(self, session_id, role, text, pack=None):
+        """Queue a turn; `pack` is the intent pack version of an assistant reply."""
+        code = _check_role(role)
+        with self._lock:
+            entry = self._cache.get(session_id)
+            if entry is not None:
+                entry[0].append((role, text))
+                if len(entry[0]) > 2 * self.window:
+                    del entry[0][:-self.window]
+            self._pending[session_id] = self._pending.get(session_id, 0) + 1
+        self._queue.put(("append", session_id, time.time(), code, text, pack))
+
+    def delete(self, session_id) -> bool:
+        with self._lock:
+            self._cache.pop(session_id, None)
+        existed = self.exists(session_id)
+        self._queue.put(("delete", session_id))
+        return existed
+
+    # ----- reads (through the cache) -----
+
+    def load(self, session_id):
+        """Last `window` (role, text) turns of the session, None if it doesn't exist."""
+        with self._lock:
+            entry = self._cache.get(session_id)
+            pending = self._pending.get(session_id)
+            if entry is not None and pending:
+                # our own writes are still queued: the cache is ahead of the database
+                self._cache.move_to_end(session_id)
+                return list(entry[0][-self.window:])
+        if pending:
+            self.flush()  # not cached any more, so read our writes back from disk
+        conn = self._connect()
+        row = conn.execute("SELECT version FROM sessions WHERE id = ?", (session_id,)).fetchone()
+        if row is None:
+            return None
+        version = row[0]
+        if entry is not None and entry[1] == version:
+            with self._lock:
+                if session_id in self._cache:
+                    self._cache.move_to_end(session_id)
+            return list(entry[0][-self.window:])
+        rows = conn.execute(
+            "SELECT role, text FROM turns WHERE session = ? ORDER BY id DESC LIMIT ?",
+            (session_id, self.window),
+        ).fetchall()
+        turns = [(ROLES[code], text) for code, text in reversed(rows)]
+        with self._lock:
+            if not self._pending.get(session_id):
+                self._cache_put(session_id, list(turns), version)
+        return turns
+
+    def exists(self, session_id) -> bool:
+        with self._lock:
+            if session_id in self._cache or self._pending.get(session_id):
+                return True
+        conn = self._connect()
+        found = conn.execute("SELECT 1 FROM sessions WHERE id = ?", (session_id,)).fetchone()
+        return found is not None
+
+    def _cache_put(self, session_id, turns, version):
+        self._cache[session_id] = [turns, version]
+        self._cache.move_to_end(session_id)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    # ----- housekeeping -----
+
+    def flush(self, timeout=None) -> bool:
+        """Wait until everything appended so far is committed."""
+        done = threading.Event()
+        self._queue.put((_FLUSH, done))
+        return done.wait(timeout)
+
+    def evict_idle(self, ttl=None) -> int:
+        """Delete sessions idle for longer than `ttl` (default: the store's)."""
+        cutoff = time.time() - (self.ttl if ttl is None else ttl)
+        conn = self._connect()
+        with conn:
+            stale = [sid for (sid,) in conn.execute(
+                "SELECT id FROM sessions WHERE last_seen < ?", (cutoff,))]
+            conn.executemany("DELETE FROM turns WHERE session = ?", [(s,) for s in stale])
+            conn.executemany("DELETE FROM sessions WHERE id = ?", [(s,) for s in stale])
+        with self._lock:
+            for sid in stale:
+                self._cache.pop(sid, None)
+        return len(stale)
+
+    def compact(self, sessions=None):
+        """
+        Drop turns older than the last `window` of each session (all of
+        them, or just `sessions`) and checkpoint the WAL.
+        """
+        conn = self._connect()
+        if sessions is None:
+            sessions = [sid for (sid,) in conn.execute("SELECT id FROM sessions")]
+        with conn:
+            for sid in sessions:
+                conn.execute(
+                    "DELETE FROM turns WHERE session = ? AND id < ("
+                    " SELECT id FROM turns WHERE session = ? ORDER BY id DESC"
+                    " LIMIT 1 OFFSET ?)",
+                    (sid, sid, self.window - 1),
+                )
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put((_STOP,))
+        self._writer.join()
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+    # ----- writer thread -----
+
+    def _write_loop(self):
+        conn = self._connect()
+        next_sweep = time.monotonic() + self.sweep_interval
+        while True:
+            ops = [self._queue.get()]
+            deadline = time.monotonic() + self.flush_interval
+            # gather a batch: whatever arrives within flush_interval, up to batch_size
+            while len(ops) < self.batch_size and ops[-1][0] not in (_FLUSH, _STOP):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    ops.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self._commit(conn, [op for op in ops if op[0] not in (_FLUSH, _STOP)])
+            for op in ops:
+                if op[0] is _FLUSH:
+                    op[1].set()
+            if ops[-1][0] is _STOP:
+                self._sweep(conn)
+                conn.close()
+                return
+            if time.monotonic() >= next_sweep:
+                self._sweep(conn)
+                next_sweep = time.monotonic() + self.sweep_interval
+
+    def _commit(self, conn, ops):
+        if not ops:
+            return
+        sessions = {}  # id -> [last_seen, turns appended]
+        done = {}  # id -> queued writes this batch settles
+        created, turns, deleted = [], [], []
+        for op in ops:
+            kind, sid = op[0], op[1]
+            if kind == "append":
+                turns.append((sid, op[3], op[4], op[5]))
+                entry = sessions.setdefault(sid, [op[2], 0])
+                entry[0] = op[2]
+                entry[1] += 1
+                done[sid] = done.get(sid, 0) + 1
+            elif kind == "create":
+                created.append((sid, op[2], op[2]))
+                turns.extend((sid, _ROLE_CODES[role], text, None) for role, text in op[3])
+                entry = sessions.setdefault(sid, [op[2], 0])
+                entry[1] += len(op[3])
+                done[sid] = done.get(sid, 0) + len(op[3]) + 1
+            elif kind == "delete":
+                deleted.append((sid,))
+                sessions.pop(sid, None)
+                turns = [t for t in turns if t[0] != sid]
+        try:
+            with conn:
+                conn.executemany(
+                    "INSERT OR IGNORE INTO sessions (id, created, last_seen) VALUES (?, ?, ?)",
+                    created,
+                )
+                # appends to a session this store never created (another process did)
+                conn.executemany(
+                    "INSERT OR IGNORE INTO sessions (id, created, last_seen) VALUES (?, ?, ?)",
+                    [(sid, seen, seen) for sid, (seen, _) in sessions.items()],
+                )
+                conn.executemany(
+                    "INSERT INTO turns (session, role, text, pack) VALUES (?, ?, ?, ?)", turns
+                )
+                conn.executemany(
+                    "UPDATE sessions SET last_seen = max(last_seen, ?), version = version + ?"
+                    " WHERE id = ?",
+                    [(seen, n, sid) for sid, (seen, n) in sessions.items()],
+                )
+                conn.executemany("DELETE FROM turns WHERE session = ?", deleted)
+                conn.executemany("DELETE FROM sessions WHERE id = ?", deleted)
+                versions = {
+                    sid: conn.execute("SELECT version FROM sessions WHERE id = ?", (sid,)).fetchone()
+                    for sid in sessions
+                }
+            self.writes += len(turns)
+            self.batches += 1
+        except sqlite3.Error:
+            self.errors += 1
+            log.exception("session store: dropped a batch of %d writes", len(ops))
+            versions = {}
+
+        with self._lock:
+            for sid, n in done.items():
+                left = self._pending.get(sid, 0) - n
+                if left > 0:
+                    self._pending[sid] = left
+                else:
+                    self._pending.pop(sid, None)
+            for sid in sessions:
+                entry = self._cache.get(sid)
+                row = versions.get(sid)
+                if entry is not None:
+                    if row is None:
+                        self._cache.pop(sid)
+                    else:
+                        entry[1] = row[0]
+            for (sid,) in deleted:
+                self._pending.pop(sid, None)
+                self._cache.pop(sid, None)
+            self._touched.update(sessions)
+
+    def _sweep(self, conn):
+        try:
+            removed = self.evict_idle()
+            with self._lock:
+                touched, self._touched = self._touched, set()
+            self.compact(touched)
+            if removed:
+                log.info("session store: evicted %d idle sessions", removed)
+        except sqlite3.Error:
+            self.errors += 1
+            log.exception("session store: sweep failed")
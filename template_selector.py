@@ -0,0 +1,91 @@
+"""
+Per-conversation template picks that keep clear of recent replies.
+
+For every template group a conversation uses, the selector keeps the
+group's template indices split into `available` and a ring buffer
+`cooldown` holding the last K picks (K = min(REPEAT_WINDOW, len(group) - 1)).
+A pick takes a uniformly random available index (swap-remove) and puts it
+in the cooldown in place of the oldest one, which becomes available
+again: O(1) per pick, and memory bounded by the intent pack rather than
+the length of the conversation.
+
+Decks are keyed by group name and rebuilt when the group's templates
+change (intent pack reload). A new deck is primed with the conversation's
+recent template replies, so a conversation restored from storage doesn't
+repeat itself either.
+"""
+import random
+
+from intent_registry import template_text
+
+REPEAT_WINDOW = 4  # replies per group kept out of that group's next picks
+
+
+class _Deck:
+    __slots__ = ("keys", "available", "cooldown", "head", "k")
+
+    def __init__(self, group, window):
+        self.keys = group.keys
+        self.available = list(range(len(group)))
+        self.cooldown = []  # ring buffer of the last k picks, oldest at `head` once full
+        self.head = 0
+        self.k = min(window, len(group) - 1)
+
+    def pick(self, rng) -> int:
+        available = self.available
+        j = rng.randrange(len(available))
+        i = available[j]
+        available[j] = available[-1]
+        available.pop()
+        self._cool(i)
+        return i
+
+    def take(self, i) -> None:
+        """Mark template i as just used (priming from history)."""
+        if i in self.available:
+            self.available.remove(i)
+            self._cool(i)
+
+    def _cool(self, i):
+        cooldown = self.cooldown
+        if len(cooldown) < self.k:
+            cooldown.append(i)
+        elif self.k:
+            self.available.append(cooldown[self.head])
+            cooldown[self.head] = i
+            self.head = (self.head + 1) % self.k
+        else:
+            self.available.append(i)
+
+
+class TemplateSelector:
+    __slots__ = ("window", "_rng", "_decks")
+
+    def __init__(self, seed=None, window=REPEAT_WINDOW):
+        self.window = window
+        # unseeded selectors share the module RNG, so random.seed() still
+        # makes a whole run reproducible
+        self._rng = random if seed is None else random.Random(seed)
+        self._decks = {}
+
+    def pick(self, group, history=None) -> int:
+        """
+        Index of the next template of `group` (an intent_registry
+        TemplateGroup). A new deck is primed from `history`'s
+        recent_replies (a Conversation's template IDs, oldest first).
+        """
+        deck = self._decks.get(group.name)
+        if deck is not None and deck.keys is not group.keys:
+            if deck.keys == group.keys:
+                deck.keys = group.keys  # same templates from a reloaded pack
+            else:
+                deck = None
+        if deck is None:
+            deck = self._decks[group.name] = _Deck(group, self.window)
+            if history is not None and not group.formatted:
+                for payload in history.recent_replies:
+                    if type(payload) is int:
+                        i = group.position(template_text(payload))
+                        if i is not None:
+                            deck.take(i)
+        return deck.pick(self._rng)
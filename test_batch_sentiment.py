@@ -0,0 +1,93 @@
+"""Parity of BatchSentimentScorer with VADER's own polarity_scores."""
+import pytest
+
+from batch_sentiment import COMPOUND_TOLERANCE, BatchSentimentScorer, parity_corpus
+
+CASES = [
+    # plain and empty
+    "",
+    "   ",
+    "hello",
+    "I feel okay today",
+    "I am so happy and grateful",
+    "everything is awful and I hate it",
+    # negation
+    "I am not happy",
+    "I don't feel good at all",
+    "I never said I wasn't fine",
+    "isn't bad, isn't great",
+    "without a doubt the best day",
+    "no one cares and nobody loves me",
+    "I'm not sad nor lonely",
+    # "but"
+    "the day was fine but I feel terrible",
+    "I hate exams but I love my friends",
+    "but honestly it was good",
+    "good but bad but great",
+    # boosters and hedges
+    "I am extremely tired",
+    "it was kinda sorta okay",
+    "I'm barely hanging on, hardly sleeping",
+    "at least I tried",
+    "the least happy I have ever been",
+    # ALL-CAPS emphasis
+    "I am SO TIRED of this",
+    "I LOVE it",
+    "EVERYTHING IS AWFUL",
+    "this is GREAT but I am SAD",
+    # punctuation emphasis
+    "I love this!!!",
+    "why does this keep happening??",
+    "what is even happening?!?!",
+    "good!!!!!!!!",
+    "really??? really!!!",
+    # emoji and emoticons
+    "had a good day 😊",
+    "my heart hurts 💔",
+    "fine 🙂 I guess",
+    "miss you <3 :(",
+    "😭😭😭",
+    # idioms and multi-word rules
+    "that party was the bomb",
+    "this cake is to die for",
+    "I kind of like it",
+    "the shit is hitting the fan",
+    "yeah right, like that will help",
+    "she is the shit",
+    # long text
+    " ".join(["I had an awful, exhausting week but my friends were wonderful."] * 40),
+]
+
+
+@pytest.fixture(scope="module")
+def scorer():
+    return BatchSentimentScorer()
+
+
+def _assert_same(want, got, text):
+    assert abs(want["compound"] - got["compound"]) <= COMPOUND_TOLERANCE + 1e-12, text
+    for key in ("neg", "neu", "pos"):
+        assert abs(want[key] - got[key]) <= 1e-3 + 1e-12, (key, text)
+
+
+@pytest.mark.parametrize("text", CASES)
+def test_case_matches_vader(scorer, text):
+    (got,) = scorer.polarity_scores_many([text])
+    _assert_same(scorer.analyzer.polarity_scores(text), got, text)
+
+
+def test_cases_as_one_batch(scorer):
+    for text, got in zip(CASES, scorer.polarity_scores_many(CASES)):
+        _assert_same(scorer.analyzer.polarity_scores(text), got, text)
+
+
+def test_generated_corpus_matches_vader(scorer):
+    texts = parity_corpus(n=2000)
+    for text, got in zip(texts, scorer.polarity_scores_many(texts)):
+        _assert_same(scorer.analyzer.polarity_scores(text), got, text)
+
+
+def test_compound_many_matches_polarity_scores(scorer):
+    texts = CASES + parity_corpus(n=200, seed=1)
+    scores = scorer.polarity_scores_many(texts)
+    assert scorer.compound_many(texts) == [s["compound"] for s in scores]
@@ -0,0 +1,183 @@
+"""The HTTP and WebSocket API, end to end over local sockets with TestClient."""
+import asyncio
+import threading
+
+import pytest
+
+import mindmate_server
+from mindmate_server import ChatServer, ChatService, TestClient
+from session_store import SQLiteStore
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def client(**service_kwargs):
+    service = ChatService(sentiment_batch=0, **service_kwargs)
+    return TestClient(ChatServer(service, port=0))
+
+
+@pytest.fixture
+def blocked_respond(monkeypatch):
+    """Replies wait until the returned Event is set (set again on teardown)."""
+    release = threading.Event()
+    respond = mindmate_server.respond
+
+    def slow(*args):
+        release.wait(10)
+        return respond(*args)
+
+    monkeypatch.setattr(mindmate_server, "respond", slow)
+    yield release
+    release.set()
+
+
+async def raw_request(port, head: bytes):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    try:
+        writer.write(head)
+        await writer.drain()
+        status_line = await reader.readline()
+        return int(status_line.split()[1])
+    finally:
+        writer.close()
+
+
+def test_session_lifecycle():
+    async def go():
+        async with client() as c:
+            status, created = await c.request("POST", "/sessions")
+            assert status == 201 and created["reply"]
+            sid = created["session"]
+
+            status, body = await c.request("POST", f"/sessions/{sid}/messages", {"text": "I feel sad"})
+            assert status == 200
+            assert body["session"] == sid and body["reply"] and body["intent"] and body["pack"]
+
+            status, body = await c.request("GET", f"/sessions/{sid}")
+            assert status == 200
+            assert [role for role, _ in body["history"]] == ["assistant", "user", "assistant"]
+            assert body["history"][1][1] == "I feel sad"
+
+            status, body = await c.request("DELETE", f"/sessions/{sid}")
+            assert (status, body) == (204, None)
+            status, _ = await c.request("GET", f"/sessions/{sid}")
+            assert status == 404
+    run(go())
+
+
+@pytest.mark.parametrize("body", [{"text": ""}, {"text": "   "}, {"message": "hi"}, ["hi"]])
+def test_message_without_text_is_400(body):
+    async def go():
+        async with client() as c:
+            _, created = await c.request("POST", "/sessions")
+            status, _ = await c.request("POST", f"/sessions/{created['session']}/messages", body)
+            assert status == 400
+    run(go())
+
+
+@pytest.mark.parametrize("length", ["abc", "-1", "1.5", "²"])
+def test_bad_content_length_is_400(length):
+    async def go():
+        async with client() as c:
+            head = (f"POST /sessions HTTP/1.1\r\nHost: localhost\r\n"
+                    f"Content-Length: {length}\r\nConnection: close\r\n\r\n")
+            assert await raw_request(c.server.port, head.encode("utf-8")) == 400
+    run(go())
+
+
+@pytest.mark.parametrize("method, path", [
+    ("GET", "/sessions/nope"),
+    ("POST", "/sessions/nope/messages"),
+    ("GET", "/sessions/nope/mood"),
+    ("GET", "/nowhere"),
+])
+def test_unknown_is_404(method, path):
+    async def go():
+        async with client() as c:
+            status, _ = await c.request(method, path, {"text": "hi"} if method == "POST" else None)
+            assert status == 404
+    run(go())
+
+
+def test_overloaded_is_503(blocked_respond):
+    async def go():
+        async with client(max_inflight=1, max_queued=0) as c:
+            _, a = await c.request("POST", "/sessions")
+            _, b = await c.request("POST", "/sessions")
+            first = asyncio.create_task(
+                c.request("POST", f"/sessions/{a['session']}/messages", {"text": "hello"})
+            )
+            while not c.server.service._slots or not c.server.service._slots.locked():
+                await asyncio.sleep(0.01)
+            status, body = await c.request("POST", f"/sessions/{b['session']}/messages", {"text": "hello"})
+            assert status == 503 and body["error"]
+            blocked_respond.set()
+            status, _ = await first
+            assert status == 200
+    run(go())
+
+
+def test_slow_reply_is_504(blocked_respond):
+    async def go():
+        async with client(reply_timeout=0.2) as c:
+            _, created = await c.request("POST", "/sessions")
+            sid = created["session"]
+            status, _ = await c.request("POST", f"/sessions/{sid}/messages", {"text": "hello"})
+            assert status == 504
+            blocked_respond.set()
+            # the late reply is still recorded, after the user's message
+            status, body = await c.request("POST", f"/sessions/{sid}/messages", {"text": "thanks"})
+            assert status == 200
+            _, body = await c.request("GET", f"/sessions/{sid}")
+            assert [role for role, _ in body["history"]] == ["assistant", "user"] * 2 + ["assistant"]
+    run(go())
+
+
+def test_delete_during_reply_stays_deleted(blocked_respond, tmp_path):
+    store = SQLiteStore(str(tmp_path / "sessions.db"))
+
+    async def go():
+        async with client(store=store) as c:
+            _, created = await c.request("POST", "/sessions")
+            sid = created["session"]
+            pending = asyncio.create_task(
+                c.request("POST", f"/sessions/{sid}/messages", {"text": "hello"})
+            )
+            while not c.server.service.sessions[sid].lock.locked():
+                await asyncio.sleep(0.01)
+            status, _ = await c.request("DELETE", f"/sessions/{sid}")
+            assert status == 204
+            store.flush()  # the delete is committed before the reply finishes
+            blocked_respond.set()
+            await pending
+            status, _ = await c.request("GET", f"/sessions/{sid}")
+            assert status == 404
+            return sid
+    try:
+        sid = run(go())
+        store.flush()
+        assert store.load(sid) is None
+    finally:
+        store.close()
+
+
+def test_websocket_round_trip():
+    async def go():
+        async with client() as c:
+            ws = await c.websocket("/ws")
+            hello = await ws.receive_json()
+            assert hello["session"] and hello["reply"]
+
+            await ws.send_json({"text": "I feel sad"})
+            body = await ws.receive_json()
+            assert body["session"] == hello["session"] and body["reply"] and body["intent"]
+
+            await ws.send_json({"nope": 1})
+            assert "error" in await ws.receive_json()
+            await ws.close()
+
+            status, history = await c.request("GET", f"/sessions/{hello['session']}")
+            assert status == 200 and len(history["history"]) == 3
+    run(go())
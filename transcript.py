@@ -0,0 +1,53 @@
+"""
+Transcript layout for the chat page.
+
+The newest turns (at least LIVE_TURNS of them) are drawn as chat bubbles
+on every rerun. Everything before them is folded into fixed blocks of
+BLOCK_TURNS turns. A folded block never changes, so its markdown is built
+once per session and reused on every rerun as a single element, and the
+per-turn snippets it is built from are cached by text, so template
+replies are formatted once per process. Drawing a page therefore costs
+the same however long the conversation gets; older blocks are only
+drawn when the reader asks for them.
+"""
+from functools import lru_cache
+
+BLOCK_TURNS = 20  # turns per folded block
+LIVE_TURNS = 20  # fewest turns kept as chat bubbles
+
+SPEAKERS = {"user": "**You**", "assistant": "**MindMate**"}
+
+
+def fold_point(total: int, live: int = LIVE_TURNS) -> int:
+    """Absolute index of the first live turn: the last block boundary leaving `live` turns."""
+    return max(0, (total - live) // BLOCK_TURNS * BLOCK_TURNS)
+
+
+@lru_cache(maxsize=4096)
+def turn_markdown(role: str, text: str) -> str:
+    return f"{SPEAKERS[role]}\n\n{text}"
+
+
+class FoldedBlocks:
+    """Markdown of one conversation's folded blocks, each built on first use."""
+
+    __slots__ = ("_blocks",)
+
+    def __init__(self):
+        self._blocks = {}
+
+    def block(self, history, index: int) -> str:
+        """Markdown for turns [index * BLOCK_TURNS, (index + 1) * BLOCK_TURNS) of `history`."""
+        text = self._blocks.get(index)
+        if text is None:
+            start = index * BLOCK_TURNS
+            text = "\n\n---\n\n".join(
+                turn_markdown(role, turn) for role, turn in history.turns(start, start + BLOCK_TURNS)
+            )
+            self._blocks[index] = text
+        return text
+
+    def forget_before(self, index: int) -> None:
+        """Drop blocks before `index` (their turns have left the history's window)."""
+        for stale in [i for i in self._blocks if i < index]:
+            del self._blocks[stale]